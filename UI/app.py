@@ -3,7 +3,6 @@ import os
 import streamlit as st
 from PIL import Image
 import re
-import tempfile
 
 # ======================================================
 # Fix ROOT PATH
@@ -18,12 +17,18 @@ if ROOT_DIR not in sys.path:
 from services.ai_input_service import extract_drug_and_indication_from_text
 from services.reference_service import get_drug_reference
 from services.logic_service import calculate_pediatric_dose_base, divide_daily_dose
-from services.preparation_pipeline import extract_reconstitution
+from services.preparation_pipeline import extract_reconstitution, ai_cross_check_result, ai_cross_check_failed, ai_cross_check_pending
 from services.safety_service import generate_safety_flags, format_safety_comment
-from services.ai_service import explain_dose_with_ollama
-from ML.drug_classification.inference import predict_drug_from_image
-from services.ai_vision_service import extract_text_from_image, extract_vial_strength_mg
-from services.logic_service import select_renal_dose
+from services.ai_service import (
+    stream_dose_explanation,
+    explain_dose_from_cached_template,
+    prefetch_explanation_template,
+    standard_explanation
+)
+from services.llm_guard import llm_metrics
+from ML.drug_classification.inference import predict_drug_from_image, MODEL_PATH as CLASSIFIER_PATH
+from services.vision_pipeline import analyze_vial_image
+from services.dosing_pipeline import DosingError, renal_band, renal_dose, is_unadjusted_band
 
 from ML.CXR.model import PneumoniaCNN
 import torch
@@ -109,6 +114,43 @@ st.markdown('<div class="subtitle">Pneumonia detection from Chest X-ray with ped
 
 st.divider()
 
+# ======================================================
+# AI cross-check of preparation data (runs in background)
+# ======================================================
+
+def show_ai_cross_check(preparation_text):
+
+    # poll only while the background check runs; finished checks render once
+    if ai_cross_check_pending(preparation_text):
+        poll_ai_cross_check(preparation_text)
+    else:
+        render_ai_cross_check(preparation_text)
+
+
+@st.fragment(run_every=2)
+def poll_ai_cross_check(preparation_text):
+
+    if ai_cross_check_pending(preparation_text):
+        st.caption("🔄 AI cross-check of preparation data running...")
+    else:
+        # rerun the page so the result is drawn without this polling fragment
+        st.rerun()
+
+
+def render_ai_cross_check(preparation_text):
+
+    discrepancy = ai_cross_check_result(preparation_text)
+
+    if discrepancy is None and ai_cross_check_failed(preparation_text):
+        st.caption("⚠ AI cross-check unavailable (model not reachable). Verify against the reference text.")
+    elif discrepancy is None:
+        st.caption("🔄 AI cross-check of preparation data running...")
+    elif discrepancy:
+        st.warning("⚠ AI cross-check disagrees with the extracted reconstitution data. Verify against the reference text.")
+    else:
+        st.caption("✅ AI cross-check agrees with the extracted reconstitution data.")
+
+
 # ======================================================
 # Session State
 # ======================================================
@@ -233,11 +275,19 @@ with tab1:
 
         if uploaded:
 
-            image = Image.open(uploaded)
+            data = uploaded.getvalue()
+
+            st.image(data, width=250)
 
-            st.image(image, width=250)
+            # CNN and OCR run concurrently; cached on disk by the hash of the
+            # bytes, so reruns / re-uploads are free
+            vision = analyze_vial_image(
+                data,
+                predict_drug_from_image,
+                model_tag=os.path.getmtime(CLASSIFIER_PATH)
+            )
 
-            drug_pred, conf = predict_drug_from_image(image)
+            drug_pred, conf = vision["drug"], vision["confidence"]
 
             st.subheader("🧠 CNN Drug Detection")
 
@@ -251,12 +301,20 @@ with tab1:
 
             st.session_state.drug = drug_pred
 
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_file:
-                image.save(tmp_file.name)
-                temp_path = tmp_file.name
+            timings = vision["timings"]
+            if vision["cached"]:
+                st.caption(f"Cached result · {timings['total_ms']:.1f} ms")
+            else:
+                st.caption(
+                    f"CNN {timings['cnn_ms']:.0f} ms · OCR {timings['ocr_ms']:.0f} ms · "
+                    f"total {timings['total_ms']:.0f} ms"
+                )
+
+            if vision["ocr_error"]:
+                st.warning(f"OCR failed: {vision['ocr_error']}")
 
-            ocr_text = extract_text_from_image(temp_path)
-            vial_strength = extract_vial_strength_mg(ocr_text)
+            ocr_text = vision["ocr_text"]
+            vial_strength = vision["vial_strength_mg"]
 
             st.subheader("🔎 OCR Strength Detection")
 
@@ -309,6 +367,9 @@ with tab2:
 
     st.markdown('<div class="section-title">📘 Drug Reference</div>', unsafe_allow_html=True)
 
+    # pre-parsed numbers from the ingest table (None -> parse the text)
+    parsed = ref.get("parsed")
+
     renal_status = st.radio(
         "Renal status",
         ["Normal renal function", "Renal impairment"]
@@ -318,6 +379,10 @@ with tab2:
 
         dosage_text = ref["dosage"]
 
+        dosing_rule = parsed["dosing"] if parsed else None
+
+        renal_gfr = None
+
         st.success("Using standard dosing")
 
     else:
@@ -334,15 +399,32 @@ with tab2:
             st.error("No renal dosing data available")
             st.stop()
 
-        selected_dose = select_renal_dose(renal_text, gfr)
+        # same band selection and renal dose as the batch / HTTP pipeline
+        selected_band = renal_band(ref, gfr)
 
-        if not selected_dose:
+        if not selected_band:
             st.error("No renal dosing matches this GFR value")
             st.stop()
 
-        dosage_text = selected_dose
+        if is_unadjusted_band(selected_band):
+
+            dosage_text = ref["dosage"]
+
+            dosing_rule = parsed["dosing"] if parsed else None
+
+            renal_gfr = None
+
+            st.success(f"{selected_band['text']} → using standard dosing")
+
+        else:
+
+            dosage_text = selected_band["text"]
+
+            dosing_rule = None
 
-        st.warning(f"Using renal-adjusted dosing for GFR = {gfr}")
+            renal_gfr = gfr
+
+            st.warning(f"Using renal-adjusted dosing for GFR = {gfr}")
 
     st.markdown('<div class="section-title">👶 Patient Information</div>', unsafe_allow_html=True)
 
@@ -361,23 +443,41 @@ with tab2:
 
     if st.button("🧮 Calculate Dose"):
 
-        base = calculate_pediatric_dose_base(
-            dosage_text,
-            weight,
-            height
-        )
+        if renal_gfr is not None:
 
-        st.session_state.dose_type = base["dose_type"]
+            try:
+                renal = renal_dose(ref, renal_gfr, weight)
+            except DosingError as e:
+                st.error(str(e))
+                st.stop()
 
-        if base["dose_type"] == "MG_KG_DOSE":
+            st.session_state.dose_type = renal["dose_type"]
 
-            low, high = base["per_dose_mg"]
+            low, high = renal["per_dose_mg"]
+
+            if renal["interval_hours"]:
+                st.caption(f"Renal dosing interval: every {renal['interval_hours']} hours")
 
         else:
 
-            dl, dh = base["daily_dose_mg"]
+            base = calculate_pediatric_dose_base(
+                dosage_text,
+                weight,
+                height,
+                rule=dosing_rule
+            )
+
+            st.session_state.dose_type = base["dose_type"]
+
+            if base["dose_type"] == "MG_KG_DOSE":
+
+                low, high = base["per_dose_mg"]
+
+            else:
+
+                dl, dh = base["daily_dose_mg"]
 
-            _, low, high = divide_daily_dose(dl, dh, interval)
+                _, low, high = divide_daily_dose(dl, dh, interval)
 
         st.markdown('<div class="metric-card">', unsafe_allow_html=True)
 
@@ -400,7 +500,15 @@ with tab2:
 
         st.markdown('<div class="section-title">💉 Drug Preparation</div>', unsafe_allow_html=True)
 
-        prep = extract_reconstitution(ref["preparation"])
+        # precomputed cross-check when available, otherwise it runs in the
+        # background and reports later
+        prep = extract_reconstitution(
+            ref["preparation"],
+            parsed=parsed["preparation"] if parsed else None,
+            ai_check="store"
+        )
+
+        show_ai_cross_check(ref["preparation"])
 
         if prep.get("reconstitution"):
 
@@ -504,11 +612,21 @@ with tab3:
 
     st.markdown('<div class="section-title">🧠 AI Clinical Explanation</div>', unsafe_allow_html=True)
 
+    fresh = st.checkbox(
+        "Fresh explanation for this patient (skip the cached explanation template)"
+    )
+
     if st.button("Explain Dose Calculation with AI"):
 
-        with st.spinner("Generating clinical explanation..."):
+        st.session_state.explanation = None
+
+        # one template per (drug, indication, dose type), numbers filled
+        # locally; when it is not cached yet the explanation is streamed
+        text = None
 
-            st.session_state.explanation = explain_dose_with_ollama(
+        if not fresh:
+
+            text = explain_dose_from_cached_template(
                 drug=st.session_state.drug,
                 indication=st.session_state.indication,
                 dose_type=st.session_state.dose_type,
@@ -516,6 +634,68 @@ with tab3:
                 calculated_high=st.session_state.dose_result["high"]
             )
 
-    if st.session_state.explanation:
+        if text:
+
+            st.session_state.explanation = text
+            st.info(text)
+
+        else:
+
+            metrics = {}
+
+            stream = stream_dose_explanation(
+                drug=st.session_state.drug,
+                indication=st.session_state.indication,
+                dose_type=st.session_state.dose_type,
+                calculated_low=st.session_state.dose_result["low"],
+                calculated_high=st.session_state.dose_result["high"],
+                metrics=metrics
+            )
+
+            # text renders as it arrives; closing the stream on a rerun
+            # (user navigates away) drops the Ollama request
+            placeholder = st.empty()
+            try:
+                with placeholder.container(border=True):
+                    text = st.write_stream(stream)
+            finally:
+                stream.close()
+
+            if metrics.get("error"):
+                # a stream cut off mid-way leaves an incomplete explanation:
+                # replace it with the standard one
+                text = standard_explanation(
+                    drug=st.session_state.drug,
+                    indication=st.session_state.indication,
+                    dose_type=st.session_state.dose_type,
+                    calculated_low=st.session_state.dose_result["low"],
+                    calculated_high=st.session_state.dose_result["high"]
+                )
+                with placeholder.container(border=True):
+                    st.write(text)
+
+            if text:
+                st.session_state.explanation = text
+
+            if metrics.get("error"):
+                st.caption("AI model unavailable or too slow; standard summary shown.")
+            elif text:
+                st.caption(
+                    f"First token after {metrics['ttft']:.2f} s · "
+                    f"total {metrics['total']:.2f} s"
+                )
+                if not fresh:
+                    # next patient with this rule gets the cached template
+                    prefetch_explanation_template(
+                        drug=st.session_state.drug,
+                        indication=st.session_state.indication,
+                        dose_type=st.session_state.dose_type
+                    )
+
+    elif st.session_state.explanation:
+
+        st.info(st.session_state.explanation)
+
+    with st.expander("AI service status"):
 
-        st.info(st.session_state.explanation)
\ No newline at end of file
+        st.json(llm_metrics())
@@ -0,0 +1,84 @@
+"""
+Benchmark: vectorized calculate_pediatric_dose_batch vs. a loop over the
+scalar calculate_pediatric_dose_base + divide_daily_dose.
+
+Also checks that both paths give identical numbers.
+
+Run from the repository root:
+    python -m benchmarks.bench_batch_dosing --sizes 10000 1000000
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from services.logic_service import (
+    parse_dosing_rule,
+    calculate_pediatric_dose_base,
+    calculate_pediatric_dose_batch,
+    divide_daily_dose,
+)
+
+
+RULES = {
+    "mg/kg/day": "50 to 100 mg/kg/day divided every 6 hours. Maximum daily dose 4 g",
+    "mg/kg/dose": "15 to 20 mg/kg/dose every 6 hours",
+    "mg/m2/day": "100 to 150 mg/m2/day",
+}
+
+INTERVAL_HOURS = 6.0
+
+
+def scalar_loop(dosage_text, rule, weights, heights):
+    per_low = np.empty(len(weights))
+    per_high = np.empty(len(weights))
+
+    for i, (weight, height) in enumerate(zip(weights.tolist(), heights.tolist())):
+        base = calculate_pediatric_dose_base(dosage_text, weight, height, rule=rule)
+        if base["dose_type"] == "MG_KG_DOSE":
+            per_low[i], per_high[i] = base["per_dose_mg"]
+        else:
+            _, per_low[i], per_high[i] = divide_daily_dose(*base["daily_dose_mg"], INTERVAL_HOURS)
+
+    return per_low, per_high
+
+
+def batch(rule, weights, heights):
+    result = calculate_pediatric_dose_batch(rule, weights, heights, INTERVAL_HOURS)
+    return result["per_dose_mg"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch vs scalar pediatric dose calculation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+
+    print(f"{'rule':>11} | {'patients':>9} | {'scalar loop':>12} | {'vectorized':>11} | {'speed-up':>8} | identical")
+    print("-" * 78)
+
+    for size in args.sizes:
+        weights = rng.uniform(2.0, 70.0, size)
+        heights = rng.uniform(45.0, 180.0, size)
+
+        for label, dosage_text in RULES.items():
+            rule = parse_dosing_rule(dosage_text)
+
+            start = time.perf_counter()
+            scalar = scalar_loop(dosage_text, rule, weights, heights)
+            scalar_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            vectorized = batch(rule, weights, heights)
+            batch_s = time.perf_counter() - start
+
+            identical = all(np.array_equal(a, b) for a, b in zip(scalar, vectorized))
+
+            print(f"{label:>11} | {size:>9} | {scalar_s * 1000:>9.1f} ms | {batch_s * 1000:>8.2f} ms | "
+                  f"{scalar_s / batch_s:>7.0f}x | {identical}")
+
+
+if __name__ == "__main__":
+    main()
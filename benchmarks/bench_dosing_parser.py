@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: dosing-text parsing per call.
+
+    legacy      detect_dose_type + extract_dose_range + extract_max_daily_dose
+                as originally written (uncompiled regexes, three passes)
+    single-pass parse_dosing_rule without the memo cache
+    memoized    parse_dosing_rule (cache hits after the first call per text)
+
+Run from the repository root:
+    python -m benchmarks.bench_dosing_parser
+"""
+
+import re
+import timeit
+import argparse
+
+from services.logic_service import parse_dosing_rule, dosing_parser_stats, DosingRule
+
+
+TEXTS = [
+    "50 to 100 mg/kg/day IV divided every 6 hours. Maximum daily dose 4 g",
+    "15 to 20 mg/kg/dose IV every 6 to 8 hours",
+    "100 to 150 mg/m2/day divided every 12 hours; max daily dose: 2000 mg",
+    "Neonates: 25 mg/kg/dose every 12 hours",
+]
+
+
+def legacy_parse(dosage_text):
+    text = dosage_text.lower()
+    if "mg/kg/day" in text:
+        dose_type = "MG_KG_DAY"
+    elif "mg/kg/dose" in text:
+        dose_type = "MG_KG_DOSE"
+    elif "mg/m2/day" in text or "mg/m²/day" in text:
+        dose_type = "MG_M2_DAY"
+    else:
+        dose_type = "UNKNOWN"
+
+    nums = [float(n) for n in re.findall(r"\d+\.?\d*", dosage_text)]
+    low, high = (nums[0], nums[1] if len(nums) > 1 else nums[0]) if nums else (None, None)
+
+    max_daily = None
+    match = re.search(r"max(imum)? daily dose[:\s]*([\d\.]+)\s*(mg|g)", dosage_text.lower())
+    if match:
+        max_daily = float(match.group(2)) * (1000 if match.group(3) == "g" else 1)
+
+    return DosingRule(dose_type, low, high, max_daily)
+
+
+def per_call_us(func, number):
+    def run():
+        for text in TEXTS:
+            func(text)
+    seconds = min(timeit.repeat(run, number=number, repeat=5))
+    return seconds / (number * len(TEXTS)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dosing-text parser micro-benchmark.")
+    parser.add_argument("--number", type=int, default=20_000)
+    args = parser.parse_args()
+
+    for text in TEXTS:
+        assert legacy_parse(text) == parse_dosing_rule.__wrapped__(text), text
+
+    results = {
+        "legacy": per_call_us(legacy_parse, args.number),
+        "single-pass": per_call_us(parse_dosing_rule.__wrapped__, args.number),
+        "memoized": per_call_us(parse_dosing_rule, args.number),
+    }
+
+    for name, us in results.items():
+        print(f"{name:>12}: {us:8.3f} us/call  ({results['legacy'] / us:5.1f}x)")
+
+    print("cache:", dosing_parser_stats())
+
+
+if __name__ == "__main__":
+    main()
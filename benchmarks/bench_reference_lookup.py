@@ -0,0 +1,163 @@
+"""
+Benchmark: drug_reference lookup latency vs. table size.
+
+Compares the original  LOWER(...) = LOWER(...) AND LOWER(indication) LIKE '%...%'
+query against the indexed query used by services.reference_backends.
+
+The data lives in a scratch schema (bench_reference) that is dropped at the
+end, so the real drug_reference table is never touched.
+
+Run from the repository root:
+    python -m benchmarks.bench_reference_lookup --sizes 1000 10000 100000 250000
+"""
+
+import os
+import time
+import random
+import argparse
+import statistics
+
+from services.db_connection import connection
+from services.reference_backends import REFERENCE_QUERY, like_contains, normalize_key
+from services.dosing_ingest import PARSER_VERSION
+
+
+BENCH_SCHEMA = "bench_reference"
+DATABASE_DIR = os.path.join(os.path.dirname(__file__), "..", "database")
+
+LEGACY_QUERY = """
+SELECT
+    dosage,
+    renal_adjustment,
+    renal_adjustment_dose,
+    administration,
+    preparation_for_administration
+FROM drug_reference
+WHERE LOWER(generic_name) = LOWER(%s)
+AND LOWER(indication) LIKE LOWER(%s);
+"""
+
+DRUG_COUNT = 5000
+INDICATIONS = [
+    "Pneumonia", "Meningitis", "Endocarditis", "Sepsis", "Osteomyelitis",
+    "Urinary tract infection", "Septic arthritis", "Skin and soft tissue infection",
+    "Intra-abdominal infection", "Febrile neutropenia", "Herpes simplex encephalitis",
+]
+
+
+def read_sql(name):
+    with open(os.path.join(DATABASE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def setup_schema(cursor):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public")
+    cursor.execute(f"SET search_path TO {BENCH_SCHEMA}, public")
+    cursor.execute(read_sql("schema.sql"))
+
+
+def grow_table(cursor, current_rows, target_rows):
+    """
+    Appends synthetic monograph rows until the table holds target_rows.
+    """
+    indications = "ARRAY[" + ", ".join(f"'{i}'" for i in INDICATIONS) + "]"
+    cursor.execute(
+        f"""
+        INSERT INTO drug_reference (
+            generic_name, brand_name, drug_class, indication, dosage,
+            renal_adjustment, renal_adjustment_dose, administration,
+            preparation_for_administration, storage_stability
+        )
+        SELECT
+            'Drug' || (g % {DRUG_COUNT}),
+            'Brand' || g,
+            'Class' || (g % 40),
+            ({indications})[1 + g % {len(INDICATIONS)}] || ' (monograph ' || g || ')',
+            '25 to 50 mg/kg/day divided every 8 hours. Maximum daily dose 4 g',
+            CASE WHEN g % 3 = 0 THEN 'yes' ELSE 'no' END,
+            'GFR 10 to 50: 25 mg/kg/dose every 12 hours',
+            'IV infusion over 30 minutes',
+            'Reconstitute 500 mg vial with 5 mL sterile water',
+            'Store at room temperature'
+        FROM generate_series(%s, %s) AS g
+        """,
+        (current_rows + 1, target_rows)
+    )
+    cursor.execute("ANALYZE drug_reference")
+
+
+def time_query(cursor, query, params_list, repeats):
+    timings = []
+    for _ in range(repeats):
+        for params in params_list:
+            start = time.perf_counter()
+            cursor.execute(query, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000, 250000])
+    parser.add_argument("--lookups", type=int, default=50,
+                        help="distinct (drug, indication) pairs per size")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+
+    with connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                setup_schema(cursor)
+
+                rows = 0
+                print(f"{'rows':>10} | {'legacy median':>14} {'legacy p95':>11} | "
+                      f"{'indexed median':>15} {'indexed p95':>12}")
+                print("-" * 72)
+
+                for size in sorted(args.sizes):
+                    grow_table(cursor, rows, size)
+                    rows = size
+
+                    pairs = [
+                        (f"Drug{random.randrange(min(DRUG_COUNT, size))}",
+                         random.choice(INDICATIONS).split()[0].lower())
+                        for _ in range(args.lookups)
+                    ]
+
+                    legacy = time_query(
+                        cursor, LEGACY_QUERY,
+                        [(drug, f"%{ind}%") for drug, ind in pairs],
+                        args.repeats
+                    )
+                    indexed = time_query(
+                        cursor, REFERENCE_QUERY,
+                        [(PARSER_VERSION, normalize_key(drug), like_contains(normalize_key(ind)))
+                         for drug, ind in pairs],
+                        args.repeats
+                    )
+
+                    print(f"{size:>10} | {legacy['median_ms']:>11.3f} ms {legacy['p95_ms']:>8.3f} ms | "
+                          f"{indexed['median_ms']:>12.3f} ms {indexed['p95_ms']:>9.3f} ms")
+
+                cursor.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+        finally:
+            # the connection goes back to the shared pool
+            with conn.cursor() as cursor:
+                cursor.execute("RESET search_path")
+            conn.autocommit = False
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark: vial-strength OCR on ML/drug_classification/rawimages.
+
+    full image     global threshold 150 over the full-resolution photo, --psm 6
+                   (the original extract_text_from_image)
+    label regions  downscale, detect text regions, OCR only the crops
+
+Reports OCR time per image (one image at a time, as in the UI), batch time
+(all images through extract_texts_from_images) and strength-detection
+accuracy. Ground truth is the strength printed on each label (LABELS),
+or taken from the file name ("1g", "1-gram", "1000-mg") for new images;
+images with neither are timed but not scored.
+
+Run from the repository root:
+    python -m benchmarks.bench_vial_ocr
+    CLINICAL_OCR_WORKERS=1 python -m benchmarks.bench_vial_ocr
+"""
+
+import os
+import re
+import time
+import argparse
+import statistics
+
+from services.ai_vision_service import (
+    load_image,
+    extract_text_from_image,
+    extract_texts_from_images,
+    extract_vial_strength_mg,
+)
+from services.ocr_engine import ocr_stats
+
+
+IMAGE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "ML", "drug_classification", "rawimages"
+)
+
+# strength (mg per vial) as printed on each label
+LABELS = {
+    "83863-1-800.webp": 500,
+    "Acyclovir-for-Injection-50-mL-Single-Dose-Vials_512x512.webp": 500,
+    "PhotoRoom-20240814_162027_8.webp": 500,
+    "acyclovir-medicine-vial-3078971.webp": 500,
+    "1g-ampi-ampicillin-sodium-injection-500x500.webp": 1000,
+    "261275.webp": 1000,
+    "5323b8c54fc01a825708a35f4f878364a4fcba9d-924x720.webp": 1000,
+    "Ampicillin-Sodium-for-Injection-0-5g-1g-with-Best-Price-GMP-.avif": 1000,
+    "Ampicillin_1g-050225.avif": 1000,
+    "ampi1-10v_hzki1pudjl8mebvb.webp": 1000,
+    "antibiotic-ampicillin-sodium-1-gram-15-ml-injection-vial-10x15-ml-sandoz-00781340495-69.gif": 1000,
+    "116636.webp": 1000,
+    "IMG_20241120_170558-600x713.webp": 1000,
+    "PhotoRoom-20240918_130325_7.webp": 1000,
+    "Vancomycin-Hydrochloride-for-Injection-1-gram-Vial_700x700.webp": 1000,
+    "Vancomycin_1g.avif": 1000,
+    "vancogram-1gm-dry-vial-of-1-powder-for-injection-front-2-1756903421-non-watermarked.webp": 1000,
+    "vancomycin-1000-mg-injection-500x500.webp": 1000,
+}
+
+FILENAME_STRENGTH_RE = re.compile(r"(?:^|[-_])(\d+)[-_]?(mg|gm|gram|g)(?=[-_.]|$)", re.I)
+
+
+def strength_from_filename(name):
+    found = {
+        int(n) * (1 if unit.lower() == "mg" else 1000)
+        for n, unit in FILENAME_STRENGTH_RE.findall(name)
+    }
+    return found.pop() if len(found) == 1 else None
+
+
+def load_dataset(image_dir=IMAGE_DIR):
+    dataset = []
+    for drug in sorted(os.listdir(image_dir)):
+        folder = os.path.join(image_dir, drug)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            try:
+                image = load_image(os.path.join(folder, name))
+            except OSError:
+                print(f"[SKIP] cannot decode {drug}/{name}")
+                continue
+            truth = LABELS.get(name) or strength_from_filename(name)
+            dataset.append((f"{drug}/{name}", image, truth))
+    return dataset
+
+
+def run_mode(dataset, regions):
+    # one image at a time (UI latency)
+    latencies = []
+    texts = []
+    for _, image, _ in dataset:
+        start = time.perf_counter()
+        texts.append(extract_text_from_image(image, regions=regions))
+        latencies.append(time.perf_counter() - start)
+
+    # whole set at once (pharmacy batch)
+    start = time.perf_counter()
+    extract_texts_from_images([image for _, image, _ in dataset], regions=regions)
+    batch_s = time.perf_counter() - start
+
+    scored = correct = 0
+    misses = []
+    for (name, _, truth), text in zip(dataset, texts):
+        if truth is None:
+            continue
+        scored += 1
+        found = extract_vial_strength_mg(text)
+        if found == truth:
+            correct += 1
+        else:
+            misses.append((name, truth, found))
+
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "batch_s": batch_s,
+        "correct": correct,
+        "scored": scored,
+        "misses": misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vial OCR benchmark: full image vs label regions.")
+    parser.add_argument("--images", default=IMAGE_DIR, help="folder with one sub-folder per drug")
+    parser.add_argument("--misses", action="store_true", help="list wrongly read images")
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.images)
+    print(f"{len(dataset)} images, {sum(t is not None for _, _, t in dataset)} with known strength")
+
+    # warm-up: starts the pool workers (language data load) outside the timings
+    extract_texts_from_images([image for _, image, _ in dataset[:1]])
+
+    results = {
+        "full image": run_mode(dataset, regions=False),
+        "label regions": run_mode(dataset, regions=True),
+    }
+
+    for name, r in results.items():
+        print(
+            f"{name:>14}: {r['mean_ms']:7.1f} ms/image (p50 {r['p50_ms']:.1f}, max {r['max_ms']:.1f}) | "
+            f"batch {r['batch_s']:.2f} s | "
+            f"strength {r['correct']}/{r['scored']} ({r['correct'] / max(r['scored'], 1):.0%})"
+        )
+        if args.misses:
+            for image, truth, found in r["misses"]:
+                print(f"{'':>16}miss {image}: expected {truth}, read {found}")
+
+    print("ocr:", ocr_stats())
+
+
+if __name__ == "__main__":
+    main()
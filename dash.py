@@ -7,6 +7,8 @@ import random
 import numpy as np
 import json
 
+from services.reference_snapshot import load_snapshot, SNAPSHOT_PATH
+
 st.set_page_config(layout="wide")
 
 PRIMARY = "#2a9d8f"
@@ -16,18 +18,33 @@ SECONDARY = "#1f4e79"
 # LOAD DATA
 # -----------------------------
 
-df = pd.read_csv("drugs.csv")
+# drug_reference snapshot (python -m services.reference_snapshot),
+# memory-mapped once and reused across reruns until the file changes.
+# Only the columns used below are converted to pandas (strings are copied
+# at that point, the rest of the table stays memory-mapped).
 
-df['renal_adjustment'] = df['renal_adjustment'].str.strip().str.lower()
+DRUG_COLUMNS = ["generic_name", "indication", "administration", "renal_adjustment"]
 
-df['renal_adjustment'] = df['renal_adjustment'].replace({
-"yes":"Adjustment Required",
-"no":"No Adjustment"
-})
+@st.cache_resource
+def load_drug_data(snapshot_mtime):
+
+    df = load_snapshot(SNAPSHOT_PATH).select(DRUG_COLUMNS).to_pandas()
 
-df['indication_group'] = df['indication'].apply(
-lambda x: "Pneumonia" if "pneumonia" in x.lower() else "Other"
-)
+    df['renal_adjustment'] = df['renal_adjustment'].str.strip().str.lower()
+
+    df['renal_adjustment'] = df['renal_adjustment'].replace({
+    "yes":"Adjustment Required",
+    "no":"No Adjustment"
+    })
+
+    df['indication_group'] = df['indication'].apply(
+    lambda x: "Pneumonia" if "pneumonia" in x.lower() else "Other"
+    )
+
+    return df
+
+# the snapshot is built separately; without it only the drug section is skipped
+df = load_drug_data(os.path.getmtime(SNAPSHOT_PATH)) if os.path.exists(SNAPSHOT_PATH) else None
 
 train_dir = "ML/CXR/CXR_dataset/train"
 classes = os.listdir(train_dir)
@@ -348,6 +365,13 @@ m4.metric("F1 Score",f"{metrics['f1']:.3f}")
 
 st.markdown("## Drug Dosing Analysis")
 
+if df is None:
+    st.error(
+        f"Drug reference snapshot not found ({SNAPSHOT_PATH}). "
+        "Build it from the database with: python -m services.reference_snapshot"
+    )
+    st.stop()
+
 m5,m6,m7,m8 = st.columns(4)
 
 m5.metric("Drugs", df['generic_name'].nunique())
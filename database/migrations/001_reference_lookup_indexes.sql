@@ -0,0 +1,24 @@
+-- Migration 001: indexed drug_reference lookups
+--
+-- Adds normalized (lower-case, whitespace-collapsed) name/indication columns,
+-- a b-tree index for the generic name equality match and a trigram index so
+-- that  indication_norm LIKE '%...%'  no longer needs a sequential scan.
+-- Safe to re-run.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE drug_reference
+    ADD COLUMN IF NOT EXISTS generic_name_norm TEXT
+        GENERATED ALWAYS AS (regexp_replace(lower(btrim(generic_name)), '\s+', ' ', 'g')) STORED;
+
+ALTER TABLE drug_reference
+    ADD COLUMN IF NOT EXISTS indication_norm TEXT
+        GENERATED ALWAYS AS (regexp_replace(lower(btrim(indication)), '\s+', ' ', 'g')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_drug_reference_generic_name_norm
+    ON drug_reference (generic_name_norm);
+
+CREATE INDEX IF NOT EXISTS idx_drug_reference_indication_norm_trgm
+    ON drug_reference USING gin (indication_norm gin_trgm_ops);
+
+ANALYZE drug_reference;
@@ -0,0 +1,25 @@
+-- Migration 002: pre-parsed dosing data
+--
+-- One row per drug_reference row, keyed on the md5 of the row's source
+-- columns (same hash as the Arrow snapshot). Filled by
+--     python -m services.dosing_ingest
+-- A changed source row gets a new hash, so stale parses are never joined;
+-- the lookup falls back to the text parsers until the ingest is re-run.
+
+CREATE TABLE IF NOT EXISTS drug_reference_parsed (
+    row_hash TEXT PRIMARY KEY,
+    parser_version INTEGER NOT NULL,
+
+    dose_type TEXT,
+    dose_low DOUBLE PRECISION,
+    dose_high DOUBLE PRECISION,
+    max_daily_mg DOUBLE PRECISION,
+
+    renal_bands JSONB NOT NULL DEFAULT '[]',
+
+    reconstitution JSONB NOT NULL DEFAULT '[]',
+    max_concentration_mg_ml DOUBLE PRECISION,
+    dilution_only BOOLEAN NOT NULL DEFAULT FALSE,
+
+    parsed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
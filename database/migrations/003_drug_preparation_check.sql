@@ -0,0 +1,25 @@
+-- Migration 003: precomputed reconstitution data and AI cross-check
+--
+-- One row per distinct preparation_for_administration text, keyed on the
+-- md5 of that text. Filled by
+--     python -m services.preparation_ingest
+-- preparation_pipeline.extract_reconstitution(..., ai_check="store") looks
+-- rows up by the hash of the text it is given, so an edited preparation
+-- text never matches an old row; it falls back to a live check until the
+-- job is re-run.
+
+CREATE TABLE IF NOT EXISTS drug_preparation_check (
+    prep_hash TEXT PRIMARY KEY,
+    extractor_version INTEGER NOT NULL,
+    model TEXT,
+
+    reconstitution JSONB NOT NULL DEFAULT '[]',
+    max_concentration_mg_ml DOUBLE PRECISION,
+    dilution_only BOOLEAN NOT NULL DEFAULT FALSE,
+
+    ai_reconstitution JSONB NOT NULL DEFAULT '[]',
+    ai_max_concentration_mg_ml DOUBLE PRECISION,
+    ai_discrepancy BOOLEAN NOT NULL DEFAULT FALSE,
+
+    checked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -1,5 +1,7 @@
 -- Database schema for Clinical Drug Dosing Decision Support System
 
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 CREATE TABLE drug_reference (
     generic_name TEXT,
     brand_name TEXT,
@@ -10,5 +12,53 @@ CREATE TABLE drug_reference (
     renal_adjustment_dose TEXT,
     administration TEXT,
     preparation_for_administration TEXT,
-    storage_stability TEXT
+    storage_stability TEXT,
+
+    -- normalized lookup keys (see migrations/001_reference_lookup_indexes.sql)
+    generic_name_norm TEXT
+        GENERATED ALWAYS AS (regexp_replace(lower(btrim(generic_name)), '\s+', ' ', 'g')) STORED,
+    indication_norm TEXT
+        GENERATED ALWAYS AS (regexp_replace(lower(btrim(indication)), '\s+', ' ', 'g')) STORED
+);
+
+CREATE INDEX idx_drug_reference_generic_name_norm
+    ON drug_reference (generic_name_norm);
+
+CREATE INDEX idx_drug_reference_indication_norm_trgm
+    ON drug_reference USING gin (indication_norm gin_trgm_ops);
+
+-- pre-parsed dosing data (see migrations/002_drug_reference_parsed.sql)
+CREATE TABLE drug_reference_parsed (
+    row_hash TEXT PRIMARY KEY,
+    parser_version INTEGER NOT NULL,
+
+    dose_type TEXT,
+    dose_low DOUBLE PRECISION,
+    dose_high DOUBLE PRECISION,
+    max_daily_mg DOUBLE PRECISION,
+
+    renal_bands JSONB NOT NULL DEFAULT '[]',
+
+    reconstitution JSONB NOT NULL DEFAULT '[]',
+    max_concentration_mg_ml DOUBLE PRECISION,
+    dilution_only BOOLEAN NOT NULL DEFAULT FALSE,
+
+    parsed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- precomputed reconstitution + AI cross-check (see migrations/003_drug_preparation_check.sql)
+CREATE TABLE drug_preparation_check (
+    prep_hash TEXT PRIMARY KEY,
+    extractor_version INTEGER NOT NULL,
+    model TEXT,
+
+    reconstitution JSONB NOT NULL DEFAULT '[]',
+    max_concentration_mg_ml DOUBLE PRECISION,
+    dilution_only BOOLEAN NOT NULL DEFAULT FALSE,
+
+    ai_reconstitution JSONB NOT NULL DEFAULT '[]',
+    ai_max_concentration_mg_ml DOUBLE PRECISION,
+    ai_discrepancy BOOLEAN NOT NULL DEFAULT FALSE,
+
+    checked_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
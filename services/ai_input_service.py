@@ -1,12 +1,113 @@
-import subprocess
 import json
+import threading
 
-def extract_drug_and_indication_from_text(query: str):
+from .llm_client import LLMError, DEFAULT_MODEL
+from .llm_guard import generate
+from .disk_cache import DiskCache, make_key
+from .entity_matcher import EntityMatcher
+from .reference_service import get_reference_vocabulary
+
+
+# bump when the prompt below changes so old answers are not reused
+PROMPT_VERSION = 1
+
+LLM_DEADLINE = 60.0                     # seconds, including the wait for a slot
+
+QUERY_CACHE_MAX_ENTRIES = 5000
+QUERY_CACHE_TTL = 30 * 24 * 3600        # seconds
+
+_query_cache = None
+
+_matcher = None             # (vocabulary, EntityMatcher)
+_stats_lock = threading.Lock()
+_stats = {"fast_path": 0, "cache": 0, "llm": 0, "failed": 0}
+
+
+def get_query_cache():
+    """
+    Persistent cache of extracted (drug, indication) per normalized query.
+    """
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = DiskCache(
+            "clinical_query",
+            max_entries=QUERY_CACHE_MAX_ENTRIES,
+            ttl=QUERY_CACHE_TTL
+        )
+    return _query_cache
+
+
+def query_cache_stats():
+    return get_query_cache().stats()
+
+
+def normalize_query(query: str):
+    return " ".join(query.lower().split())
+
+
+def _count(path):
+    with _stats_lock:
+        _stats[path] += 1
+
+
+def extraction_stats():
+    """
+    How queries were resolved: dictionary fast path, disk cache, LLM or failed.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    total = sum(stats.values())
+    for path in list(stats):
+        stats[f"{path}_rate"] = stats[path] / total if total else 0.0
+    stats["total"] = total
+    return stats
+
+
+def get_entity_matcher():
+    """
+    EntityMatcher over the current drug_reference vocabulary
+    (rebuilt when the reference data changes).
+    """
+    global _matcher
+    vocabulary = get_reference_vocabulary()
+    if _matcher is None or _matcher[0] is not vocabulary:
+        _matcher = (vocabulary, EntityMatcher(vocabulary))
+    return _matcher[1]
+
+
+def match_query_terms(query: str):
+    """
+    Deterministic fast path; (None, None) when not confident.
     """
-    Uses Ollama to extract drug name and indication from a free-text clinical query.
+    try:
+        matcher = get_entity_matcher()
+    except Exception:
+        # reference data unavailable: leave it to the LLM
+        return None, None
+    return matcher.match(query)
+
+
+def extract_drug_and_indication_from_text(query: str, use_cache=True, use_fast_path=True):
+    """
+    Extracts drug name and indication from a free-text clinical query.
+    Tries the drug_reference dictionary first, then the disk cache, then Ollama.
     Returns (drug, indication)
     """
 
+    if use_fast_path:
+        drug, indication = match_query_terms(query)
+        if drug and indication:
+            _count("fast_path")
+            return drug, indication
+
+    key = make_key(PROMPT_VERSION, DEFAULT_MODEL, normalize_query(query))
+
+    if use_cache:
+        cached = get_query_cache().get(key)
+        if cached is not None:
+            _count("cache")
+            return cached["drug"], cached["indication"]
+
     prompt = f"""
 You are a medical NLP assistant.
 
@@ -21,16 +122,23 @@ Sentence:
 {query}
 """
 
-    result = subprocess.run(
-        ["ollama", "run", "mistral"],
-        input=prompt.encode("utf-8"),
-        capture_output=True
-    )
-
-    output = result.stdout.decode("utf-8", errors="ignore").strip()
+    try:
+        output = generate(prompt, "extract_query", LLM_DEADLINE, json_mode=True).strip()
+    except LLMError:
+        _count("failed")
+        return None, None
 
     try:
         data = json.loads(output)
-        return data.get("drug"), data.get("indication")
+        drug, indication = data.get("drug"), data.get("indication")
     except Exception:
+        _count("failed")
         return None, None
+
+    _count("llm" if drug and indication else "failed")
+
+    # only complete answers are cached; failures are retried next time
+    if use_cache and drug and indication:
+        get_query_cache().set(key, {"drug": drug, "indication": indication})
+
+    return drug, indication
@@ -1,11 +1,16 @@
-import subprocess
 import json
 
+from .llm_guard import generate
 
-def extract_reconstitution_ai(preparation_text: str):
+
+LLM_DEADLINE = 20.0      # seconds, including the wait for a slot
+
+
+def extract_reconstitution_ai(preparation_text: str, strict=False):
     """
     AI extraction layer (secondary validation).
-    Returns structured data safely.
+    Returns structured data safely; with strict=True model and JSON
+    errors are raised instead of returning empty data.
     """
 
     prompt = f"""
@@ -28,14 +33,7 @@ Text:
 """
 
     try:
-        result = subprocess.run(
-            ["ollama", "run", "mistral"],
-            input=prompt.encode("utf-8"),
-            capture_output=True,
-            timeout=20
-        )
-
-        output = result.stdout.decode("utf-8", errors="ignore").strip()
+        output = generate(prompt, "reconstitution", LLM_DEADLINE, json_mode=True).strip()
 
         json_start = output.find("{")
         json_end = output.rfind("}") + 1
@@ -44,6 +42,8 @@ Text:
         data = json.loads(clean_json)
 
     except Exception:
+        if strict:
+            raise
         data = {}
 
     return {
@@ -1,4 +1,10 @@
-import subprocess
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .llm_client import LLMError, DEFAULT_MODEL
+from .llm_guard import generate, generate_stream
+from .disk_cache import DiskCache, make_key
 
 """
 AI service module using a local LLM (Ollama)
@@ -6,6 +12,103 @@ to provide explainable pediatric dose calculations.
 """
 
 
+LLM_DEADLINE = 120.0                    # seconds (first call may load the model)
+
+# bump when the template prompt below changes so old templates are not reused
+TEMPLATE_VERSION = 1
+
+TEMPLATE_CACHE_MAX_ENTRIES = 2000
+TEMPLATE_CACHE_TTL = 30 * 24 * 3600     # seconds
+
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+_template_cache = None
+
+_template_executor = None
+_template_jobs = set()          # template keys being generated in the background
+_template_jobs_lock = threading.Lock()
+
+
+def get_template_cache():
+    """
+    Persistent cache of explanation templates per dosing rule.
+    """
+    global _template_cache
+    if _template_cache is None:
+        _template_cache = DiskCache(
+            "explanation_template",
+            max_entries=TEMPLATE_CACHE_MAX_ENTRIES,
+            ttl=TEMPLATE_CACHE_TTL
+        )
+    return _template_cache
+
+
+def template_cache_stats():
+    return get_template_cache().stats()
+
+
+DOSE_TYPE_BASIS = {
+    "MG_KG_DAY": "the mg/kg/day rate for this indication multiplied by the patient's weight, then divided over the dosing interval",
+    "MG_KG_DOSE": "the mg/kg per-dose rate for this indication multiplied by the patient's weight",
+    "MG_M2_DAY": "the mg/m² rate for this indication multiplied by the patient's body surface area (from weight and height)",
+}
+
+
+def standard_explanation(drug, indication, dose_type,
+                         calculated_low, calculated_high,
+                         weight=None, height=None):
+    """
+    Deterministic explanation used when the model is unavailable.
+    """
+
+    basis = DOSE_TYPE_BASIS.get(dose_type, "the dosing rule in the drug reference")
+
+    text = (
+        f"(AI explanation unavailable - standard summary.) "
+        f"The {drug} dose for {indication} was calculated from {basis}"
+    )
+    details = []
+    if weight:
+        details.append(f"weight {weight} kg")
+    if height:
+        details.append(f"height {height} cm")
+    if details:
+        text += f" ({', '.join(details)})"
+    text += (
+        f", giving {calculated_low:.2f} to {calculated_high:.2f} mg per administration. "
+        f"Verify against the reference monograph."
+    )
+    return text
+
+
+def _explanation_prompt(drug, indication, dose_type,
+                        calculated_low, calculated_high,
+                        weight=None, height=None):
+
+    prompt = f"""
+You are a clinical assistant explaining pediatric drug dosing.
+
+Drug: {drug}
+Indication: {indication}
+Dose type: {dose_type}
+Calculated dose range: {calculated_low:.2f} to {calculated_high:.2f} mg
+"""
+
+    if weight:
+        prompt += f"Patient weight: {weight} kg\n"
+    if height:
+        prompt += f"Patient height: {height} cm\n"
+
+    prompt += """
+Explain clearly how this dose was calculated.
+Do not recommend changes.
+Do not prescribe.
+Only explain the calculation in simple clinical language.
+"""
+
+    return prompt
+
+
 def explain_dose_with_ollama(
     drug,
     indication,
@@ -20,34 +123,262 @@ def explain_dose_with_ollama(
     pediatric dose calculations in clinical language.
     """
 
+    prompt = _explanation_prompt(
+        drug, indication, dose_type,
+        calculated_low, calculated_high, weight, height
+    )
+
+    try:
+        return generate(prompt, "explain", LLM_DEADLINE).strip()
+    except LLMError:
+        return standard_explanation(
+            drug, indication, dose_type,
+            calculated_low, calculated_high, weight, height
+        )
+
+
+def stream_dose_explanation(
+    drug,
+    indication,
+    dose_type,
+    calculated_low,
+    calculated_high,
+    weight=None,
+    height=None,
+    metrics=None
+):
+    """
+    Same explanation as explain_dose_with_ollama, but yields the text
+    as the model produces it. metrics (optional dict) receives ttft,
+    total and error. If the model fails before the first token the
+    standard explanation is yielded instead.
+    """
+
+    prompt = _explanation_prompt(
+        drug, indication, dose_type,
+        calculated_low, calculated_high, weight, height
+    )
+
+    if metrics is not None:
+        metrics["error"] = None
+
+    stream = generate_stream(prompt, "explain_stream", LLM_DEADLINE, metrics=metrics)
+    started = False
+    try:
+        for chunk in stream:
+            started = True
+            yield chunk
+    except LLMError as e:
+        if metrics is not None:
+            metrics["error"] = str(e)
+        if not started:
+            yield standard_explanation(
+                drug, indication, dose_type,
+                calculated_low, calculated_high, weight, height
+            )
+    finally:
+        stream.close()
+
+
+# =====================================================
+# TEMPLATE MODE: one LLM explanation per dosing rule
+# =====================================================
+
+def _template_placeholders(weight, height):
+    placeholders = ["low", "high"]
+    if weight:
+        placeholders.append("weight")
+    if height:
+        placeholders.append("height")
+    return placeholders
+
+
+def _template_prompt(drug, indication, dose_type, placeholders):
+
     prompt = f"""
 You are a clinical assistant explaining pediatric drug dosing.
 
 Drug: {drug}
 Indication: {indication}
 Dose type: {dose_type}
-Calculated dose range: {calculated_low:.2f} to {calculated_high:.2f} mg
+
+Write an explanation template that will be reused for many patients.
+Do not write any patient numbers. Instead use exactly these placeholders
+where the values belong:
 """
 
-    if weight:
-        prompt += f"Patient weight: {weight} kg\n"
-    if height:
-        prompt += f"Patient height: {height} cm\n"
+    descriptions = {
+        "low": "{low} = lower end of the calculated dose in mg",
+        "high": "{high} = upper end of the calculated dose in mg",
+        "weight": "{weight} = patient weight in kg",
+        "height": "{height} = patient height in cm",
+    }
+    for name in placeholders:
+        prompt += descriptions[name] + "\n"
 
     prompt += """
+Do not use curly braces for anything else.
 Explain clearly how this dose was calculated.
 Do not recommend changes.
 Do not prescribe.
 Only explain the calculation in simple clinical language.
 """
 
-    result = subprocess.run(
-            ["ollama", "run", "mistral"],
-            input=prompt,
-            text=True,
-            capture_output=True,
-            check=False
+    return prompt
+
+
+def _valid_template(template, placeholders):
+    used = set(PLACEHOLDER_RE.findall(template))
+    return {"low", "high"} <= used and used <= set(placeholders)
+
+
+def fill_explanation_template(template, calculated_low, calculated_high,
+                              weight=None, height=None):
+    values = {
+        "low": f"{calculated_low:.2f}",
+        "high": f"{calculated_high:.2f}",
+        "weight": f"{weight}",
+        "height": f"{height}",
+    }
+    return PLACEHOLDER_RE.sub(lambda m: values.get(m.group(1), m.group(0)), template)
+
+
+def _template_key(drug, indication, dose_type, placeholders):
+    return make_key(
+        TEMPLATE_VERSION, DEFAULT_MODEL,
+        " ".join(str(drug).lower().split()),
+        " ".join(str(indication).lower().split()),
+        dose_type, placeholders
+    )
+
+
+def get_explanation_template(drug, indication, dose_type,
+                             weight=None, height=None, refresh=False):
+    """
+    Cached explanation template for (drug, indication, dose_type).
+    refresh=True asks the model for a new template and replaces the cached one.
+    Returns None if the template is unusable; raises LLMError if the
+    model is unavailable.
+    """
+
+    placeholders = _template_placeholders(weight, height)
+    key = _template_key(drug, indication, dose_type, placeholders)
+
+    cache = get_template_cache()
+
+    if not refresh:
+        template = cache.get(key)
+        if template is not None:
+            return template
+
+    template = generate(
+        _template_prompt(drug, indication, dose_type, placeholders),
+        "explain_template", LLM_DEADLINE
+    ).strip()
+
+    if not _valid_template(template, placeholders):
+        return None
+
+    cache.set(key, template)
+    return template
+
+
+def explain_dose_from_template(
+    drug,
+    indication,
+    dose_type,
+    calculated_low,
+    calculated_high,
+    weight=None,
+    height=None,
+    refresh=False
+):
+    """
+    Explanation built from the cached per-rule template with the patient
+    numbers filled in locally (milliseconds once the template exists).
+    Falls back to a per-patient explanation if the model returns an unusable
+    template, and to standard_explanation if the model is unavailable.
+    refresh=True forces a new LLM generation of the template.
+    """
+
+    try:
+        template = get_explanation_template(
+            drug, indication, dose_type, weight, height, refresh=refresh
+        )
+    except LLMError:
+        return standard_explanation(
+            drug, indication, dose_type,
+            calculated_low, calculated_high, weight, height
         )
 
+    if template is None:
+        return explain_dose_with_ollama(
+            drug, indication, dose_type,
+            calculated_low, calculated_high, weight, height
+        )
+
+    return fill_explanation_template(
+        template, calculated_low, calculated_high, weight, height
+    )
+
+
+def explain_dose_from_cached_template(
+    drug,
+    indication,
+    dose_type,
+    calculated_low,
+    calculated_high,
+    weight=None,
+    height=None
+):
+    """
+    Filled explanation when the template for this rule is already cached,
+    otherwise None. Never calls the model, so the UI can stream a fresh
+    explanation instead of blocking on the first template generation.
+    """
+
+    placeholders = _template_placeholders(weight, height)
+    template = get_template_cache().get(
+        _template_key(drug, indication, dose_type, placeholders)
+    )
+    if template is None:
+        return None
+
+    return fill_explanation_template(
+        template, calculated_low, calculated_high, weight, height
+    )
+
+
+def _generate_template_quietly(key, *args):
+    try:
+        get_explanation_template(*args)
+    except LLMError:
+        pass
+    finally:
+        with _template_jobs_lock:
+            _template_jobs.discard(key)
+
+
+def prefetch_explanation_template(drug, indication, dose_type,
+                                  weight=None, height=None):
+    """
+    Generates the template for this rule in the background (once per rule
+    at a time), so the next patient gets the cached explanation.
+    """
+    global _template_executor
+
+    key = _template_key(drug, indication, dose_type, _template_placeholders(weight, height))
+
+    with _template_jobs_lock:
+        if key in _template_jobs:
+            return
+        _template_jobs.add(key)
+        if _template_executor is None:
+            _template_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="explain-template"
+            )
 
-    return result.stdout.strip()
+    _template_executor.submit(
+        _generate_template_quietly, key,
+        drug, indication, dose_type, weight, height
+    )
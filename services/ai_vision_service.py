@@ -1,21 +1,188 @@
-#C:\Program Files\Tesseract-OCR
 # ai_vision_service.py
-import pytesseract
+# Tesseract location / engine: see services/ocr_engine.py (TESSERACT_CMD)
+import io
+import os
+import hashlib
+
+import cv2
+import numpy as np
 from PIL import Image
 
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+from .ocr_engine import get_ocr_pool, OCRError
+from .disk_cache import DiskCache
 
 
-import cv2
+def load_image(source):
+    """
+    Decodes an image once into an RGB PIL image.
+    Accepts a file path, raw bytes, a file-like object (e.g. a Streamlit
+    upload), a PIL image or an RGB NumPy array.
+    """
+    if isinstance(source, Image.Image):
+        return source if source.mode == "RGB" else source.convert("RGB")
+    if isinstance(source, np.ndarray):
+        return Image.fromarray(source).convert("RGB")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source).convert("RGB")
+
+
+def image_to_gray(source):
+    """
+    Grayscale uint8 array for OCR, without re-encoding the image.
+    NumPy arrays are taken as RGB (RGBA / single channel also work);
+    paths are read with OpenCV as before.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return cv2.cvtColor(cv2.imread(os.fspath(source)), cv2.COLOR_BGR2GRAY)
+
+    pixels = source if isinstance(source, np.ndarray) else np.asarray(load_image(source))
+
+    if pixels.ndim == 2:
+        return pixels
+    if pixels.shape[2] == 4:
+        return cv2.cvtColor(pixels, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+
+
+# ======================================================
+# Label region detection
+# ======================================================
 
+OCR_MAX_SIDE = 1400         # px; photos are downscaled to this before OCR
+REGION_PSM = 11             # sparse text: a crop may hold several label lines
+MIN_REGION_AREA = 300       # px², smaller blobs are specks / edges
+REGION_PADDING = 4          # px around each crop
 
-def extract_text_from_image(image_path: str) -> str:
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)[1]
 
-    text = pytesseract.image_to_string(gray, config="--psm 6")
-    return text.lower()
+def downscale(gray, max_side=OCR_MAX_SIDE):
+    h, w = gray.shape
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def find_label_regions(gray):
+    """
+    Bounding boxes (x, y, w, h) of text blocks, in reading order.
+    Dark-on-light and light-on-dark strokes are picked out with black-hat /
+    top-hat, horizontal gradients are closed into lines and blocks, and
+    the outer contours give the boxes.
+    """
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 7))
+    strokes = np.maximum(
+        cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel),
+        cv2.morphologyEx(gray, cv2.MORPH_TOPHAT, kernel)
+    )
+
+    grad = np.absolute(cv2.Sobel(strokes, cv2.CV_32F, 1, 0, ksize=3))
+    grad = cv2.normalize(grad, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (17, 3)))
+
+    mask = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9)))
+    mask = cv2.erode(mask, None, iterations=2)
+    mask = cv2.dilate(mask, None, iterations=3)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = [cv2.boundingRect(c) for c in contours]
+    boxes = [b for b in boxes if b[2] * b[3] >= MIN_REGION_AREA]
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+
+def label_crops(image):
+    """
+    Binarized crops of the text regions of a (downscaled) vial photo.
+    """
+    gray = downscale(image_to_gray(image))
+    h, w = gray.shape
+
+    crops = []
+    for x, y, bw, bh in find_label_regions(gray):
+        p = REGION_PADDING
+        crop = gray[max(0, y - p):min(h, y + bh + p), max(0, x - p):min(w, x + bw + p)]
+        crops.append(cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1])
+    return crops
+
+
+# ======================================================
+# OCR
+# ======================================================
+
+def preprocess_for_ocr(image):
+    """
+    Whole-image preprocessing (original path, regions=False).
+    """
+    gray = image_to_gray(image)
+    return cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)[1]
+
+
+def _join(texts):
+    return "\n".join(t for t in texts if t).lower()
+
+
+def extract_text_from_image(image, timeout=None, regions=True) -> str:
+    """
+    OCR of a vial label on the shared Tesseract pool. `image` is anything
+    load_image accepts; pass the already decoded image to avoid decoding
+    it again.
+    regions=True OCRs only the detected label regions (in parallel);
+    regions=False OCRs the whole full-resolution photo.
+    Raises OCRError / OCRTimeout (for regions: when every crop failed).
+    """
+    pool = get_ocr_pool()
+
+    crops = label_crops(image) if regions else []
+    if not crops:
+        return pool.recognize(preprocess_for_ocr(image), timeout=timeout).lower()
+
+    futures = [pool.submit(crop, timeout, psm=REGION_PSM) for crop in crops]
+    texts = []
+    error = None
+    for future in futures:
+        try:
+            texts.append(future.result())
+        except OCRError as e:
+            error = error or e
+    if not texts:
+        raise error
+    return _join(texts)
+
+
+def extract_texts_from_images(images, timeout=None, regions=True):
+    """
+    OCR of a batch of vial photos on all pool workers, in input order.
+    Images that fail give None.
+    """
+    pool = get_ocr_pool()
+
+    if not regions:
+        texts = pool.recognize_many(
+            (preprocess_for_ocr(image) for image in images), timeout=timeout
+        )
+        return [text.lower() if text is not None else None for text in texts]
+
+    # every crop of every image goes to the pool at once
+    jobs = []
+    for image in images:
+        crops = label_crops(image)
+        if crops:
+            jobs.append([pool.submit(crop, timeout, psm=REGION_PSM) for crop in crops])
+        else:
+            jobs.append([pool.submit(preprocess_for_ocr(image), timeout)])
+
+    results = []
+    for futures in jobs:
+        texts = []
+        for future in futures:
+            try:
+                texts.append(future.result())
+            except OCRError:
+                texts.append(None)
+        results.append(_join(texts) if any(t is not None for t in texts) else None)
+    return results
 
 
 import re
@@ -46,3 +213,31 @@ def extract_vial_strength_mg(ocr_text: str):
     return None
 
 
+# ======================================================
+# Vision result cache (keyed on the image bytes)
+# ======================================================
+
+# bump when the OCR preprocessing or strength parsing changes
+VISION_CACHE_VERSION = 1
+VISION_CACHE_MAX_ENTRIES = 2000
+
+_vision_cache = None
+
+
+def get_vision_cache():
+    """
+    Persistent cache of classifier + OCR results per image content,
+    shared by every Streamlit session on the machine.
+    """
+    global _vision_cache
+    if _vision_cache is None:
+        _vision_cache = DiskCache("vision", max_entries=VISION_CACHE_MAX_ENTRIES)
+    return _vision_cache
+
+
+def vision_cache_stats():
+    return get_vision_cache().stats()
+
+
+def image_hash(data: bytes):
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,226 @@
+"""
+Batch dosing: stream orders from CSV / JSONL, write results as they finish.
+
+Each input record has: drug, indication, weight, height, gfr, interval, vial
+(height / gfr / interval / vial may be blank). A record that fails, or a
+line that cannot be parsed, is written with status "error" and the run
+carries on.
+
+    python -m services.main --batch orders.csv --output results.jsonl --workers 8
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .dosing_pipeline import process_order, order_number, DosingError, MIN_INTERVAL_HOURS
+
+
+INPUT_FIELDS = ["drug", "indication", "weight", "height", "gfr", "interval", "vial"]
+
+CSV_OUTPUT_FIELDS = [
+    "record", "status", "error",
+    "drug", "indication", "weight", "height", "gfr",
+    "dose_type", "renal", "renal_band",
+    "daily_dose_low_mg", "daily_dose_high_mg", "doses_per_day", "interval_hours",
+    "dose_low_mg", "dose_high_mg",
+    "vial_mg", "concentration_mg_ml", "withdraw_low_ml", "withdraw_high_ml",
+    "dilution_required", "safety_flags",
+]
+
+
+# ======================================================
+# Input
+# ======================================================
+def _file_format(path, default="jsonl"):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    return default
+
+
+def _read_csv(f):
+    reader = csv.DictReader(f)
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield None, f"Line {reader.line_num}: invalid CSV row: {e}"
+            continue
+        if None in record:
+            yield None, f"Line {reader.line_num}: more fields than the header"
+        else:
+            yield record, None
+
+
+def _read_jsonl(f):
+    for line_num, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield None, f"Line {line_num}: invalid JSON: {e}"
+            continue
+        if isinstance(record, dict):
+            yield record, None
+        else:
+            yield None, f"Line {line_num}: expected a JSON object"
+
+
+def read_orders(path):
+    """
+    Yields (record, error) one input record at a time (the file is never
+    loaded whole). A line that cannot be parsed gives (None, message) and
+    reading carries on.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if _file_format(path) == "csv":
+            yield from _read_csv(f)
+        else:
+            yield from _read_jsonl(f)
+
+
+def _number(record, field, integer=False, allow_zero=False, minimum=None):
+    # same checks as the HTTP service (finite, positive, whole vial strengths)
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        return None
+    return order_number(value, field, integer=integer, allow_zero=allow_zero, minimum=minimum)
+
+
+def run_record(index, record, parse_error=None):
+    """
+    Processes one input record; never raises.
+    """
+    if parse_error is not None:
+        return {"record": index, "status": "error", "error": parse_error,
+                **{field: None for field in INPUT_FIELDS}}
+
+    try:
+        result = process_order(
+            drug=record.get("drug"),
+            indication=record.get("indication"),
+            weight=_number(record, "weight"),
+            height=_number(record, "height"),
+            gfr=_number(record, "gfr", allow_zero=True),
+            interval_hours=_number(record, "interval", minimum=MIN_INTERVAL_HOURS),
+            vial_mg=_number(record, "vial", integer=True),
+        )
+        return {"record": index, "status": "ok", "error": None, **result}
+
+    except (DosingError, ValueError, TypeError, KeyError) as e:
+        message = str(e)
+    except Exception as e:      # e.g. database errors: report and carry on
+        message = f"{type(e).__name__}: {e}"
+
+    return {
+        "record": index,
+        "status": "error",
+        "error": message,
+        **{field: record.get(field) for field in INPUT_FIELDS},
+    }
+
+
+# ======================================================
+# Output
+# ======================================================
+def _csv_row(result):
+    prep = result.get("reconstitution") or {}
+    daily = result.get("daily_dose_mg") or (None, None)
+    per_dose = result.get("per_dose_mg") or (None, None)
+    withdraw = prep.get("withdraw_volume_ml") or (None, None)
+
+    return {
+        "record": result["record"],
+        "status": result["status"],
+        "error": result.get("error"),
+        "drug": result.get("drug"),
+        "indication": result.get("indication"),
+        "weight": result.get("weight"),
+        "height": result.get("height"),
+        "gfr": result.get("gfr"),
+        "dose_type": result.get("dose_type"),
+        "renal": result.get("renal"),
+        "renal_band": result.get("renal_band"),
+        "daily_dose_low_mg": daily[0],
+        "daily_dose_high_mg": daily[1],
+        "doses_per_day": result.get("doses_per_day"),
+        "interval_hours": result.get("interval_hours"),
+        "dose_low_mg": per_dose[0],
+        "dose_high_mg": per_dose[1],
+        "vial_mg": prep.get("vial_mg"),
+        "concentration_mg_ml": prep.get("concentration_mg_ml"),
+        "withdraw_low_ml": withdraw[0],
+        "withdraw_high_ml": withdraw[1],
+        "dilution_required": prep.get("dilution_required"),
+        "safety_flags": " | ".join(result.get("safety_flags") or []),
+    }
+
+
+class ResultWriter:
+
+    def __init__(self, f, fmt):
+        self.f = f
+        self.fmt = fmt
+        if fmt == "csv":
+            self.writer = csv.DictWriter(f, fieldnames=CSV_OUTPUT_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, result):
+        if self.fmt == "csv":
+            self.writer.writerow(_csv_row(result))
+        else:
+            self.f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+
+# ======================================================
+# Runner
+# ======================================================
+def run_batch(input_path, output_path=None, workers=4, output_format=None):
+    """
+    Streams orders through a pool of `workers` threads. Results are written
+    in input order as soon as they are ready; at most workers * 4 records
+    are in flight. Returns a summary dict.
+    """
+    output_format = output_format or _file_format(output_path or "", default="jsonl")
+    max_in_flight = max(1, workers) * 4
+
+    summary = {"records": 0, "ok": 0, "errors": 0}
+    start = time.perf_counter()
+
+    out = open(output_path, "w", newline="", encoding="utf-8") if output_path else sys.stdout
+    try:
+        writer = ResultWriter(out, output_format)
+        pending = deque()
+
+        def drain(limit):
+            while len(pending) > limit:
+                result = pending.popleft().result()
+                writer.write(result)
+                summary["records"] += 1
+                summary["ok" if result["status"] == "ok" else "errors"] += 1
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            try:
+                for index, (record, error) in enumerate(read_orders(input_path)):
+                    pending.append(pool.submit(run_record, index, record, error))
+                    drain(max_in_flight)
+            finally:
+                # results already computed are written even if reading fails
+                drain(0)
+    finally:
+        if output_path:
+            out.close()
+
+    summary["elapsed_s"] = time.perf_counter() - start
+    return summary
@@ -0,0 +1,138 @@
+"""
+Small persistent key/value cache backed by SQLite.
+
+Values are JSON. Entries expire after a TTL and the least recently used
+ones are evicted once `max_entries` is exceeded. A hit only rewrites the
+access time when it is older than TOUCH_INTERVAL, so most reads stay reads. The file is shared by
+every process / Streamlit session on the machine and survives restarts.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+CACHE_DIR = os.environ.get(
+    "CLINICAL_CACHE_DIR",
+    os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), ".cache")
+)
+
+TOUCH_INTERVAL = 60.0   # seconds; LRU order is only as precise as this
+
+
+def make_key(*parts):
+    """
+    Stable hash key from any JSON-serializable parts.
+    """
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+
+    def __init__(self, name, max_entries=10_000, ttl=None, directory=CACHE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.sqlite")
+        self.max_entries = max_entries
+        self.ttl = ttl                      # seconds, None = never expires
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0}
+
+        db = self._db()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+        db.commit()
+
+    def _db(self):
+        # one connection per thread; WAL lets readers and a writer overlap
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def get(self, key, default=None):
+        db = self._db()
+        row = db.execute(
+            "SELECT value, created_at, accessed_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            self._count("misses")
+            return default
+
+        value, created_at, accessed_at = row
+        now = time.time()
+
+        if self.ttl is not None and now - created_at > self.ttl:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            db.commit()
+            self._count("expired")
+            self._count("misses")
+            return default
+
+        if now - accessed_at > TOUCH_INTERVAL:
+            db.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+        self._count("hits")
+        return json.loads(value)
+
+    def set(self, key, value):
+        db = self._db()
+        now = time.time()
+        db.execute(
+            "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now, now)
+        )
+        evicted = db.execute(
+            """
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        ).rowcount
+        db.commit()
+
+        self._count("writes")
+        if evicted > 0:
+            self._count("evictions", evicted)
+
+    def delete(self, key):
+        db = self._db()
+        db.execute("DELETE FROM cache WHERE key = ?", (key,))
+        db.commit()
+
+    def clear(self):
+        db = self._db()
+        db.execute("DELETE FROM cache")
+        db.commit()
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["size"] = len(self)
+        return stats
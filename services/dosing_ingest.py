@@ -0,0 +1,157 @@
+"""
+Ingest stage: parse every drug_reference row once into
+drug_reference_parsed (database/migrations/002_drug_reference_parsed.sql).
+
+The request path then reads numbers from that table instead of running
+the text parsers; rows without a current parse still fall back to them.
+
+    python -m services.dosing_ingest          # parse new / changed rows
+    python -m services.dosing_ingest --full   # re-parse everything
+"""
+
+import json
+import argparse
+
+from .logic_service import DosingRule, parse_dosing_rule, parse_renal_bands
+from .preparation_service import rule_based_reconstitution
+from .reference_columns import row_hash_sql
+
+
+# bump when the parsers change so existing rows are re-parsed
+PARSER_VERSION = 3
+
+
+def parse_reference_row(dosage, renal_adjustment_dose, preparation):
+    """
+    Structured form of one drug_reference row.
+    """
+    rule = parse_dosing_rule(dosage or "")
+
+    renal_bands = [
+        dict(band, dosing=band["dosing"]._asdict())
+        for band in parse_renal_bands(renal_adjustment_dose or "")
+    ]
+
+    prep = rule_based_reconstitution(preparation or "")
+
+    return {
+        "dose_type": rule.dose_type,
+        "dose_low": rule.low,
+        "dose_high": rule.high,
+        "max_daily_mg": rule.max_daily_mg,
+        "renal_bands": renal_bands,
+        "reconstitution": prep["reconstitution"],
+        "max_concentration_mg_ml": prep["max_concentration_mg_ml"],
+        "dilution_only": prep["dilution_only"],
+    }
+
+
+def parsed_from_row(dose_type, dose_low, dose_high, max_daily_mg,
+                    renal_bands, reconstitution, max_concentration_mg_ml, dilution_only):
+    """
+    Turns drug_reference_parsed columns back into the structures used by
+    logic_service and preparation_pipeline.
+    """
+    return {
+        "dosing": DosingRule(dose_type, dose_low, dose_high, max_daily_mg),
+        "renal_bands": [
+            dict(band, dosing=DosingRule(**band["dosing"]))
+            for band in renal_bands
+        ],
+        "preparation": {
+            "reconstitution": reconstitution,
+            "max_concentration_mg_ml": max_concentration_mg_ml,
+            "dilution_only": dilution_only,
+        },
+    }
+
+
+def ingest(full=False):
+    """
+    Parses drug_reference rows that have no current parse and removes
+    parses whose source row no longer exists. Returns (parsed, removed).
+    """
+    # only the ingest job needs Postgres; the parsers above do not
+    from psycopg2.extras import execute_values
+    from .db_connection import connection
+
+    select_query = f"""
+    SELECT d.row_hash, d.dosage, d.renal_adjustment_dose, d.preparation_for_administration
+    FROM (
+        SELECT {row_hash_sql()} AS row_hash, dosage, renal_adjustment_dose,
+               preparation_for_administration
+        FROM drug_reference
+    ) d
+    LEFT JOIN drug_reference_parsed p ON p.row_hash = d.row_hash
+    WHERE %s OR p.row_hash IS NULL OR p.parser_version <> %s;
+    """
+
+    upsert_query = """
+    INSERT INTO drug_reference_parsed (
+        row_hash, parser_version, dose_type, dose_low, dose_high, max_daily_mg,
+        renal_bands, reconstitution, max_concentration_mg_ml, dilution_only
+    )
+    VALUES %s
+    ON CONFLICT (row_hash) DO UPDATE SET
+        parser_version = EXCLUDED.parser_version,
+        dose_type = EXCLUDED.dose_type,
+        dose_low = EXCLUDED.dose_low,
+        dose_high = EXCLUDED.dose_high,
+        max_daily_mg = EXCLUDED.max_daily_mg,
+        renal_bands = EXCLUDED.renal_bands,
+        reconstitution = EXCLUDED.reconstitution,
+        max_concentration_mg_ml = EXCLUDED.max_concentration_mg_ml,
+        dilution_only = EXCLUDED.dilution_only,
+        parsed_at = now();
+    """
+
+    cleanup_query = f"""
+    DELETE FROM drug_reference_parsed p
+    WHERE NOT EXISTS (
+        SELECT 1 FROM drug_reference d WHERE {row_hash_sql("d")} = p.row_hash
+    );
+    """
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(select_query, (full, PARSER_VERSION))
+            rows = cursor.fetchall()
+
+            values = {}
+            for row_hash, dosage, renal_text, preparation in rows:
+                parsed = parse_reference_row(dosage, renal_text, preparation)
+                values[row_hash] = (
+                    row_hash,
+                    PARSER_VERSION,
+                    parsed["dose_type"],
+                    parsed["dose_low"],
+                    parsed["dose_high"],
+                    parsed["max_daily_mg"],
+                    json.dumps(parsed["renal_bands"]),
+                    json.dumps(parsed["reconstitution"]),
+                    parsed["max_concentration_mg_ml"],
+                    parsed["dilution_only"],
+                )
+
+            if values:
+                execute_values(cursor, upsert_query, list(values.values()))
+
+            cursor.execute(cleanup_query)
+            removed = cursor.rowcount
+
+        conn.commit()
+
+    return len(values), removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse drug_reference into drug_reference_parsed.")
+    parser.add_argument("--full", action="store_true", help="re-parse every row")
+    args = parser.parse_args()
+
+    parsed, removed = ingest(full=args.full)
+    print(f"[OK] drug_reference_parsed: {parsed} rows parsed | {removed} stale rows removed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Non-interactive dosing pipeline.
+
+The same steps as the interactive CLI (services/main.py), as plain
+functions: reference lookup -> dose (standard or renal) -> reconstitution
+-> safety flags. Used by the CLI, the batch runner and the HTTP service.
+"""
+
+import re
+import math
+
+from .reference_service import get_drug_reference
+from .logic_service import (
+    calculate_pediatric_dose_base,
+    divide_daily_dose,
+    get_renal_index,
+    split_renal_line
+)
+from .preparation_service import rule_based_reconstitution
+from .safety_service import generate_safety_flags
+
+
+RENAL_DOSE_RE = re.compile(r"(\d+)\s*to\s*(\d+)\s*mg/kg/dose")
+RENAL_INTERVAL_RE = re.compile(r"every\s+(\d+)")
+NO_ADJUSTMENT_RE = re.compile(
+    r"no (?:dose |dosage |renal )?adjustment|adjustment not (?:required|needed)|usual dose|standard dose"
+)
+
+
+MIN_INTERVAL_HOURS = 1.0        # shortest dosing interval accepted in an order
+
+
+class DosingError(Exception):
+    """A patient/order that cannot be dosed from the reference data."""
+
+
+def order_number(value, name, integer=False, allow_zero=False, minimum=None):
+    """
+    Validated number for an order field (string or number). It must be
+    finite and positive (allow_zero for a GFR of 0) and at least `minimum`;
+    integer=True rejects fractional values (vial strengths) instead of
+    truncating them. Raises ValueError.
+    """
+    try:
+        if isinstance(value, bool):
+            raise ValueError(value)
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}: {value!r}")
+
+    if not math.isfinite(number) or number < 0 or (number == 0 and not allow_zero):
+        raise ValueError(f"Invalid value for {name}: {value!r} (must be a positive number)")
+    if minimum is not None and number < minimum:
+        raise ValueError(f"Invalid value for {name}: {value!r} (must be at least {minimum:g})")
+    if integer:
+        if not number.is_integer():
+            raise ValueError(f"Invalid value for {name}: {value!r} (must be a whole number)")
+        return int(number)
+    return number
+
+
+def lookup_reference(drug, indication):
+    ref = get_drug_reference(drug, indication)
+    if not ref:
+        raise DosingError(f"No reference found for {drug} / {indication}.")
+    return ref
+
+
+def needs_height(ref):
+    dosage = (ref["dosage"] or "").lower()
+    return "mg/m2" in dosage or "mg/m²" in dosage
+
+
+# ======================================================
+# Dose calculation
+# ======================================================
+def standard_dose(ref, weight, height=None, interval_hours=None):
+    """
+    Reference dosing. Daily doses are split by interval_hours.
+    """
+    base = calculate_pediatric_dose_base(
+        dosage_text=ref["dosage"],
+        weight=weight,
+        height=height,
+        rule=ref["parsed"]["dosing"] if ref.get("parsed") else None
+    )
+
+    if not base:
+        raise DosingError("Dose calculation failed.")
+
+    result = {
+        "dose_type": base["dose_type"],
+        "renal": False,
+        "daily_dose_mg": None,
+        "doses_per_day": None,
+        "interval_hours": interval_hours,
+    }
+
+    if base["dose_type"] == "MG_KG_DOSE":
+        result["per_dose_mg"] = base["per_dose_mg"]
+        return result
+
+    if not interval_hours:
+        raise DosingError("Dosing interval (hours) is required for a daily dose.")
+
+    dl, dh = base["daily_dose_mg"]
+    doses_per_day, pl, ph = divide_daily_dose(dl, dh, interval_hours)
+
+    result["daily_dose_mg"] = (dl, dh)
+    result["doses_per_day"] = doses_per_day
+    result["per_dose_mg"] = (pl, ph)
+    return result
+
+
+def renal_band(ref, gfr):
+    """
+    Renal dosing band matching the GFR, or None.
+    """
+    renal_index = (
+        ref["parsed"]["renal_index"] if ref.get("parsed")
+        else get_renal_index(ref["renal_adjustment_dose"] or "")
+    )
+    return renal_index.select(gfr)
+
+
+def is_unadjusted_band(band):
+    """
+    True for bands that keep the standard dose ("GFR > 50: no adjustment",
+    or a GFR condition with no dose text at all).
+    """
+    _, dose_text = split_renal_line(band["text"].lower())
+    return not dose_text or bool(NO_ADJUSTMENT_RE.search(dose_text))
+
+
+def gfr_dose(ref, gfr, weight, height=None, interval_hours=None):
+    """
+    Dosing for a patient with a known GFR: the renal dose of the matching
+    band, or standard dosing when no band matches or the band keeps the
+    usual dose. renal_band holds the matched band text (None if none).
+    """
+    band = renal_band(ref, gfr)
+    if band and not is_unadjusted_band(band):
+        return renal_dose(ref, gfr, weight)
+
+    dose = standard_dose(ref, weight, height, interval_hours)
+    dose["renal_band"] = band["text"] if band else None
+    return dose
+
+
+def renal_dose(ref, gfr, weight):
+    """
+    Renal-adjusted dosing for the GFR band that matches the patient.
+    """
+    band = renal_band(ref, gfr)
+    if not band:
+        raise DosingError(f"Patient GFR = {gfr}. No matching renal dosing available.")
+
+    text = band["text"].lower()
+
+    dose_match = RENAL_DOSE_RE.search(text)
+    if not dose_match:
+        raise DosingError("Could not extract renal dose (mg/kg/dose).")
+
+    dose_low = float(dose_match.group(1))
+    dose_high = float(dose_match.group(2))
+
+    interval_match = RENAL_INTERVAL_RE.search(text)
+
+    return {
+        "dose_type": "MG_KG_DOSE",
+        "renal": True,
+        "renal_band": band["text"],
+        "daily_dose_mg": None,
+        "doses_per_day": None,
+        "interval_hours": int(interval_match.group(1)) if interval_match else None,
+        "per_dose_mg": (weight * dose_low, weight * dose_high),
+    }
+
+
+# ======================================================
+# Reconstitution
+# ======================================================
+def reconstitute(prep_data, vial_mg, dose_low, dose_high):
+    """
+    Concentration and withdrawal volumes for the selected vial strength.
+    Returns None when the vial is not in the reference data.
+    """
+    selected = next(
+        (x for x in prep_data.get("reconstitution") or [] if x["vial_mg"] == vial_mg),
+        None
+    )
+    if not selected:
+        return None
+
+    max_conc = prep_data.get("max_concentration_mg_ml")
+    concentration = selected["vial_mg"] / selected["volume_ml"]
+
+    result = {
+        "vial_mg": selected["vial_mg"],
+        "diluent_ml": selected["volume_ml"],
+        "concentration_mg_ml": concentration,
+        "withdraw_volume_ml": (dose_low / concentration, dose_high / concentration),
+        "max_concentration_mg_ml": max_conc,
+        "dilution_required": bool(max_conc and concentration > max_conc),
+        "final_volume_ml": None,
+        "additional_diluent_ml": None,
+    }
+
+    if result["dilution_required"]:
+        final_low, final_high = dose_low / max_conc, dose_high / max_conc
+        result["final_volume_ml"] = (final_low, final_high)
+        result["additional_diluent_ml"] = (
+            final_low - result["withdraw_volume_ml"][0],
+            final_high - result["withdraw_volume_ml"][1],
+        )
+
+    return result
+
+
+def preparation_data(ref):
+    """
+    Deterministic reconstitution data (pre-parsed when available).
+    """
+    if ref.get("parsed"):
+        return ref["parsed"]["preparation"]
+    return rule_based_reconstitution(ref["preparation"] or "")
+
+
+# ======================================================
+# Whole order
+# ======================================================
+def process_order(drug, indication, weight, height=None, gfr=None,
+                  interval_hours=None, vial_mg=None):
+    """
+    Runs one order through the pipeline and returns a flat result dict.
+    A GFR that matches no renal band, or a band without adjustment (e.g.
+    normal renal function), gets standard dosing, with a safety flag
+    saying so.
+    Raises DosingError for orders that cannot be dosed.
+    """
+    ref = lookup_reference(drug, indication)
+
+    if needs_height(ref) and height is None:
+        raise DosingError("Patient height is required for mg/m² dosing.")
+
+    if gfr is not None:
+        dose = gfr_dose(ref, gfr, weight, height, interval_hours)
+    else:
+        dose = standard_dose(ref, weight, height, interval_hours)
+
+    pl, ph = dose["per_dose_mg"]
+
+    prep = None
+    if vial_mg is not None:
+        prep = reconstitute(preparation_data(ref), vial_mg, pl, ph)
+        if prep is None:
+            raise DosingError(f"Vial strength {vial_mg} mg not found in reference data.")
+
+    flags = generate_safety_flags(
+        daily_dose_mg=dose["daily_dose_mg"][1] if dose["daily_dose_mg"] else None,
+        max_daily_dose_mg=None,
+        dose_per_administration_mg=ph,
+        withdrawal_volume_ml=prep["withdraw_volume_ml"][1] if prep else None
+    )
+    if gfr is not None and not dose["renal"]:
+        reason = (
+            f"renal band '{dose['renal_band']}'" if dose["renal_band"]
+            else "no renal adjustment band matches"
+        )
+        flags = [
+            f"GFR {gfr:g}: {reason}, standard dosing used."
+        ] + [flag for flag in flags if flag != "No immediate safety concerns detected."]
+
+    return {
+        "drug": drug,
+        "indication": indication,
+        "weight": weight,
+        "height": height,
+        "gfr": gfr,
+        **dose,
+        "reconstitution": prep,
+        "safety_flags": flags,
+    }
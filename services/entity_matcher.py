@@ -0,0 +1,120 @@
+"""
+Deterministic drug / indication extraction from clinical queries.
+
+A token trie built from drug_reference (generic names, brand names and
+indications) finds the longest known phrases in a query in one scan.
+A query is resolved only when the match is unambiguous; otherwise the
+caller falls back to the LLM extractor.
+"""
+
+import re
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# indication phrases are also indexed piece by piece, e.g.
+# "Pneumonia (community-acquired)" -> "pneumonia", "community-acquired"
+INDICATION_SPLIT_RE = re.compile(r"[,;/()\[\]:]|\band\b|\bor\b")
+
+MIN_TERM_LENGTH = 4        # ignore very short indication fragments
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class TermTrie:
+    """
+    Token-level trie: maps token sequences to payloads.
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, tokens, payload):
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(None, set()).add(payload)
+
+    def find_all(self, tokens):
+        """
+        Longest match at every position, non-overlapping, left to right.
+        Returns a list of payload sets.
+        """
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node = self.root
+            best_end, best = None, None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if None in node:
+                    best_end, best = j, node[None]
+            if best is None:
+                i += 1
+            else:
+                matches.append(best)
+                i = best_end
+        return matches
+
+
+class EntityMatcher:
+
+    def __init__(self, vocabulary):
+        """
+        vocabulary: iterable of (generic_name, brand_name, indication) rows.
+        """
+        self.drugs = TermTrie()          # phrase -> generic_name
+        self.indications = TermTrie()    # phrase -> indication phrase
+        self.drug_indications = {}       # generic_name -> [normalized indications]
+
+        for generic_name, brand_name, indication in vocabulary:
+            self.drugs.add(tokenize(generic_name), generic_name)
+            if brand_name:
+                for brand in re.split(r"[,;/]", brand_name):
+                    self.drugs.add(tokenize(brand), generic_name)
+
+            if not indication:
+                continue
+
+            normalized = " ".join(indication.lower().split())
+            self.drug_indications.setdefault(generic_name, []).append(normalized)
+
+            for phrase in [normalized] + INDICATION_SPLIT_RE.split(normalized):
+                phrase = " ".join(phrase.split())
+                if len(phrase) >= MIN_TERM_LENGTH:
+                    self.indications.add(tokenize(phrase), phrase)
+
+    def match(self, query):
+        """
+        Returns (drug, indication) when the query names exactly one known
+        drug and one indication phrase listed for that drug, else (None, None).
+        """
+        tokens = tokenize(query)
+
+        drugs = set().union(*self.drugs.find_all(tokens)) if tokens else set()
+        if len(drugs) != 1:
+            return None, None
+        drug = next(iter(drugs))
+
+        # indication phrases that occur in this drug's reference rows
+        # (the reference lookup matches indications by substring)
+        known = self.drug_indications.get(drug, [])
+        rows_hit = {}
+        for found in self.indications.find_all(tokens):
+            for phrase in found:
+                rows = frozenset(i for i, ind in enumerate(known) if phrase in ind)
+                if rows:
+                    rows_hit[phrase] = rows
+
+        # confident only if every matched phrase points at the same rows,
+        # e.g. "community-acquired" + "pneumonia" for one monograph
+        if not rows_hit or len(set(rows_hit.values())) != 1:
+            return None, None
+
+        return drug, max(rows_hit, key=len)
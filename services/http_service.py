@@ -0,0 +1,458 @@
+"""
+Headless dosing HTTP/JSON service (stdlib only).
+
+    POST /calculate       {drug, indication, weight, height?, interval_hours?}
+    POST /renal-adjust    {drug, indication, weight, gfr, height?, interval_hours?}
+                          (standard dosing when the GFR needs no adjustment)
+    POST /reconstitute    {drug, indication, vial_mg, dose_low_mg, dose_high_mg}
+    POST /safety-check    {daily_dose_mg?, max_daily_dose_mg?,
+                           dose_per_administration_mg?, withdrawal_volume_ml?}
+    POST /order           whole pipeline (same fields as the batch mode)
+    GET  /health
+
+Connections are HTTP/1.1 keep-alive. Requests are served by a bounded
+worker pool; when it is full new requests get 503. Between requests an
+idle connection is parked on a selector and holds no worker, so a client
+connection pool larger than --workers does not starve the service. Each
+request has a deadline and returns 504 when the pipeline does not finish
+in time; the abandoned call keeps its pipeline slot until it really ends,
+and requests that find no free slot get 503.
+
+    python -m services.http_service --port 8080 --workers 16 --timeout 10
+"""
+
+import json
+import time
+import queue
+import socket
+import argparse
+import selectors
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from .dosing_pipeline import (
+    DosingError,
+    MIN_INTERVAL_HOURS,
+    order_number,
+    lookup_reference,
+    needs_height,
+    standard_dose,
+    gfr_dose,
+    reconstitute,
+    preparation_data,
+    process_order
+)
+from .safety_service import generate_safety_flags
+
+
+DEFAULT_WORKERS = 16
+DEFAULT_QUEUE = 64              # connections waiting for a worker
+DEFAULT_REQUEST_TIMEOUT = 10.0  # seconds per request
+KEEP_ALIVE_TIMEOUT = 15.0       # idle seconds before a connection is closed
+IDLE_POLL_INTERVAL = 1.0        # seconds between idle-connection expiry scans
+MAX_BODY_BYTES = 64 * 1024
+
+
+class BadRequest(Exception):
+    """Malformed request body or missing fields (HTTP 400)."""
+
+
+def _field(body, name, cast=float, required=True, allow_zero=False, minimum=None):
+    """
+    Field of the request body. Numbers are checked by order_number
+    (finite, positive, whole numbers for cast=int).
+    """
+    value = body.get(name)
+    if value is None or value == "":
+        if required:
+            raise BadRequest(f"Missing field: {name}")
+        return None
+    if cast is str:
+        return str(value)
+
+    try:
+        return order_number(value, name, integer=cast is int,
+                            allow_zero=allow_zero, minimum=minimum)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+# ======================================================
+# Endpoints
+# ======================================================
+def handle_calculate(body):
+    ref = lookup_reference(_field(body, "drug", str), _field(body, "indication", str))
+    height = _field(body, "height", required=False)
+    if needs_height(ref) and height is None:
+        raise BadRequest("Missing field: height (mg/m² dosing)")
+    return standard_dose(
+        ref,
+        _field(body, "weight"),
+        height,
+        _field(body, "interval_hours", required=False, minimum=MIN_INTERVAL_HOURS)
+    )
+
+
+def handle_renal_adjust(body):
+    ref = lookup_reference(_field(body, "drug", str), _field(body, "indication", str))
+    height = _field(body, "height", required=False)
+    if needs_height(ref) and height is None:
+        raise BadRequest("Missing field: height (mg/m² dosing)")
+    return gfr_dose(
+        ref,
+        _field(body, "gfr", allow_zero=True),
+        _field(body, "weight"),
+        height,
+        _field(body, "interval_hours", required=False, minimum=MIN_INTERVAL_HOURS)
+    )
+
+
+def handle_reconstitute(body):
+    ref = lookup_reference(_field(body, "drug", str), _field(body, "indication", str))
+    prep_data = preparation_data(ref)
+    result = reconstitute(
+        prep_data,
+        _field(body, "vial_mg", int),
+        _field(body, "dose_low_mg"),
+        _field(body, "dose_high_mg")
+    )
+    if result is None:
+        raise DosingError(
+            "Vial strength not found in reference data. Available: "
+            + ", ".join(str(x["vial_mg"]) for x in prep_data.get("reconstitution") or [])
+        )
+    return result
+
+
+def handle_safety_check(body):
+    return {
+        "safety_flags": generate_safety_flags(
+            daily_dose_mg=_field(body, "daily_dose_mg", required=False),
+            max_daily_dose_mg=_field(body, "max_daily_dose_mg", required=False),
+            dose_per_administration_mg=_field(body, "dose_per_administration_mg", required=False),
+            withdrawal_volume_ml=_field(body, "withdrawal_volume_ml", required=False)
+        )
+    }
+
+
+def handle_order(body):
+    return process_order(
+        drug=_field(body, "drug", str),
+        indication=_field(body, "indication", str),
+        weight=_field(body, "weight"),
+        height=_field(body, "height", required=False),
+        gfr=_field(body, "gfr", required=False, allow_zero=True),
+        interval_hours=_field(body, "interval_hours", required=False, minimum=MIN_INTERVAL_HOURS),
+        vial_mg=_field(body, "vial_mg", int, required=False)
+    )
+
+
+ROUTES = {
+    "/calculate": handle_calculate,
+    "/renal-adjust": handle_renal_adjust,
+    "/reconstitute": handle_reconstitute,
+    "/safety-check": handle_safety_check,
+    "/order": handle_order,
+}
+
+
+# ======================================================
+# HTTP plumbing
+# ======================================================
+class DosingRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"       # keep-alive
+    timeout = KEEP_ALIVE_TIMEOUT        # socket timeout for slow clients
+    server_version = "ClinicalDosing/1.0"
+
+    def handle(self):
+        # one request per call; between requests the server parks the
+        # connection instead of blocking a worker on the next read
+        self.close_connection = True
+        self.handle_one_request()
+
+    def finish(self):
+        if self.close_connection:
+            super().finish()
+        else:
+            self.wfile.flush()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", **self.server.stats()})
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        handler = ROUTES.get(self.path)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": "Request body too large"})
+            return
+        raw = self.rfile.read(length) if length else b""
+
+        if handler is None:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+
+        try:
+            body = json.loads(raw or b"{}")
+            if not isinstance(body, dict):
+                raise BadRequest("Request body must be a JSON object")
+        except (ValueError, BadRequest) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        status, payload = self.server.run_request(handler, body)
+        self._send_json(status, payload)
+
+
+def _has_buffered_input(handler):
+    """
+    True when the next (pipelined) request is already in the read buffer,
+    where the selector cannot see it.
+    """
+    sock = handler.connection
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        return bool(handler.rfile.peek(1))
+    except (OSError, ValueError):
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+
+class DosingHTTPServer(HTTPServer):
+    """
+    HTTPServer that hands requests to a bounded thread pool and runs
+    the pipeline on a separate pool so every request has a deadline.
+    Idle keep-alive connections wait on a selector thread, not a worker.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, verbose=False):
+        super().__init__(address, DosingRequestHandler)
+        self.request_timeout = request_timeout
+        self.verbose = verbose
+
+        self._connections = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self._compute = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dosing")
+        # held until the pipeline call really finishes, also after a 504
+        self._compute_slots = threading.BoundedSemaphore(workers)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0, "timeouts": 0, "rejected": 0,
+                       "total_time_s": 0.0}
+
+        # idle keep-alive connections
+        self._idle = selectors.DefaultSelector()
+        self._parked = queue.SimpleQueue()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._idle.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._closing = False
+        self._idle_thread = threading.Thread(target=self._watch_idle, name="http-idle", daemon=True)
+        self._idle_thread.start()
+
+    # ---------- connections ----------
+    def process_request(self, request, client_address):
+        self._dispatch(request, client_address, None)
+
+    def _dispatch(self, request, client_address, handler):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            self._reject(request)
+            return
+        self._connections.submit(self._process, request, client_address, handler)
+
+    def _process(self, request, client_address, handler):
+        keep_alive = False
+        try:
+            if handler is None:
+                # the constructor serves the first request
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                handler.handle()
+                handler.finish()
+            keep_alive = not handler.close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self._slots.release()
+            if keep_alive:
+                self._park(request, client_address, handler)
+            else:
+                self.shutdown_request(request)
+
+    def _park(self, request, client_address, handler):
+        if _has_buffered_input(handler):
+            self._dispatch(request, client_address, handler)
+            return
+        self._parked.put((request, client_address, handler))
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _watch_idle(self):
+        """
+        Selector loop: a parked connection goes back to the worker pool
+        when its next request arrives and is closed after
+        KEEP_ALIVE_TIMEOUT idle seconds.
+        """
+        while not self._closing:
+            for key, _ in self._idle.select(timeout=IDLE_POLL_INTERVAL):
+                if key.data is None:
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                self._idle.unregister(key.fileobj)
+                request, client_address, handler, _ = key.data
+                self._dispatch(request, client_address, handler)
+
+            now = time.monotonic()
+            while True:
+                try:
+                    request, client_address, handler = self._parked.get_nowait()
+                except queue.Empty:
+                    break
+                self._idle.register(
+                    request, selectors.EVENT_READ,
+                    (request, client_address, handler, now + KEEP_ALIVE_TIMEOUT)
+                )
+
+            for key in list(self._idle.get_map().values()):
+                if key.data is not None and key.data[3] < now:
+                    self._idle.unregister(key.fileobj)
+                    self.shutdown_request(key.fileobj)
+
+        for key in list(self._idle.get_map().values()):
+            if key.data is not None:
+                self.shutdown_request(key.fileobj)
+        self._idle.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+    def _reject(self, request):
+        body = b'{"error": "Server busy"}'
+        try:
+            request.sendall(
+                b"HTTP/1.1 503 Service Unavailable\r\n"
+                b"Content-Type: application/json\r\nConnection: close\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+            )
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    # ---------- requests ----------
+    def run_request(self, handler, body):
+        start = time.perf_counter()
+
+        if not self._compute_slots.acquire(blocking=False):
+            # every pipeline thread is busy, possibly with abandoned work
+            with self._lock:
+                self._stats["rejected"] += 1
+            return 503, {"error": "Server busy"}
+        try:
+            future = self._compute.submit(handler, body)
+        except Exception:
+            self._compute_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._compute_slots.release())
+
+        try:
+            status, payload = 200, future.result(timeout=self.request_timeout)
+        except FutureTimeout:
+            # a running call cannot be stopped; its slot frees when it ends
+            future.cancel()
+            status, payload = 504, {"error": f"Request exceeded {self.request_timeout:.1f} s"}
+        except BadRequest as e:
+            status, payload = 400, {"error": str(e)}
+        except DosingError as e:
+            status, payload = 422, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["total_time_s"] += time.perf_counter() - start
+            if status == 504:
+                self._stats["timeouts"] += 1
+            elif status >= 400:
+                self._stats["errors"] += 1
+
+        return status, payload
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["idle_connections"] = len(self._idle.get_map()) - 1 if not self._closing else 0
+        stats["avg_time_ms"] = stats["total_time_s"] / stats["requests"] * 1000 if stats["requests"] else 0.0
+        return stats
+
+    def server_close(self):
+        super().server_close()
+        self._closing = True
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            pass
+        self._idle_thread.join(timeout=IDLE_POLL_INTERVAL * 2)
+        self._connections.shutdown(wait=False)
+        self._compute.shutdown(wait=False)
+
+
+def serve(host="127.0.0.1", port=8080, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE,
+          request_timeout=DEFAULT_REQUEST_TIMEOUT, verbose=False):
+    server = DosingHTTPServer((host, port), workers, queue_size, request_timeout, verbose)
+    print(f"[OK] Dosing service on http://{host}:{port} ({workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless dosing HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE,
+                        help="connections allowed to wait for a worker")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help="per-request deadline in seconds")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.queue, args.timeout, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Shared client for the local Ollama server (HTTP API).
+
+One pooled keep-alive session for the whole process instead of spawning
+`ollama run` per call; `keep_alive` keeps the model resident between calls.
+"""
+
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+OLLAMA_URL = os.environ.get("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+if "://" not in OLLAMA_URL:
+    OLLAMA_URL = "http://" + OLLAMA_URL
+
+DEFAULT_MODEL = os.environ.get("OLLAMA_MODEL", "mistral")
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+DEFAULT_TIMEOUT = 120.0         # seconds (first call may load the model)
+CONNECT_TIMEOUT = 3.0
+POOL_SIZE = 10
+
+
+class LLMError(Exception):
+    """The local model could not be reached or returned an error."""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _payload(prompt, model, json_mode, keep_alive, options, stream):
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "stream": stream,
+        "keep_alive": keep_alive,
+    }
+    if json_mode:
+        payload["format"] = "json"
+    if options:
+        payload["options"] = options
+    return payload
+
+
+def generate(prompt, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT,
+             json_mode=False, keep_alive=KEEP_ALIVE, options=None):
+    """
+    Runs one prompt and returns the full response text.
+    json_mode asks Ollama to constrain the output to valid JSON.
+    Raises LLMError on connection errors, timeouts and HTTP errors.
+    """
+    try:
+        response = get_session().post(
+            f"{OLLAMA_URL}/api/generate",
+            json=_payload(prompt, model, json_mode, keep_alive, options, stream=False),
+            timeout=(CONNECT_TIMEOUT, timeout)
+        )
+        response.raise_for_status()
+        return response.json().get("response", "")
+    except (requests.RequestException, ValueError) as e:
+        raise LLMError(f"Ollama request failed: {e}") from e
+
+
+def generate_stream(prompt, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT,
+                    keep_alive=KEEP_ALIVE, options=None, metrics=None):
+    """
+    Runs one prompt and yields response text chunks as the model produces them.
+    If a metrics dict is given it is filled with ttft (seconds to the first
+    token), total (seconds) and chunks.
+    Closing the generator (or dropping it) closes the HTTP response, which
+    makes Ollama stop generating.
+    Raises LLMError on connection errors, timeouts and HTTP errors.
+    """
+    start = time.perf_counter()
+    if metrics is not None:
+        metrics.update(ttft=None, total=None, chunks=0)
+
+    response = None
+    try:
+        response = get_session().post(
+            f"{OLLAMA_URL}/api/generate",
+            json=_payload(prompt, model, False, keep_alive, options, stream=True),
+            timeout=(CONNECT_TIMEOUT, timeout),
+            stream=True
+        )
+        response.raise_for_status()
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise LLMError(f"Ollama error: {data['error']}")
+
+            chunk = data.get("response", "")
+            if chunk:
+                if metrics is not None:
+                    if metrics["ttft"] is None:
+                        metrics["ttft"] = time.perf_counter() - start
+                    metrics["chunks"] += 1
+                yield chunk
+
+            if data.get("done"):
+                break
+    except (requests.RequestException, ValueError) as e:
+        raise LLMError(f"Ollama request failed: {e}") from e
+    finally:
+        if response is not None:
+            response.close()
+        if metrics is not None:
+            metrics["total"] = time.perf_counter() - start
@@ -0,0 +1,328 @@
+"""
+Resilience layer in front of llm_client, used by every LLM call site
+(ai_input_service, ai_service, ai_preparation_service).
+
+- deadline:     total time budget per call, including the wait for a slot
+- concurrency:  at most MAX_CONCURRENCY calls reach the model at once
+- breaker:      after FAILURE_THRESHOLD consecutive failures calls fail fast
+                with CircuitOpen for RESET_TIMEOUT seconds, so callers go
+                straight to their deterministic fallback; then one trial
+                call decides whether the circuit closes again
+- metrics:      latency histogram and error counts per operation,
+                see llm_metrics() / prometheus_metrics()
+
+Every failure is raised as LLMError (or a subclass), which the call sites
+already handle.
+"""
+
+import os
+import time
+import threading
+
+import requests
+
+from .llm_client import generate as _generate, generate_stream as _generate_stream, LLMError
+
+
+MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "2"))
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 30.0            # seconds the circuit stays open
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class CircuitOpen(LLMError):
+    """The model failed repeatedly; calls are short-circuited for a while."""
+
+
+class LLMBusy(LLMError):
+    """No concurrency slot became free before the deadline."""
+
+
+class DeadlineExceeded(LLMError):
+    """The call did not finish within its deadline."""
+
+
+# ======================================================
+# Circuit breaker
+# ======================================================
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures,
+    open -> half_open after `reset_timeout` seconds (one trial call),
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return self._state
+
+    def allow(self):
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = "half_open"
+            # half_open: let a single trial call through
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """A call ended without telling us anything about the model's health."""
+        with self._lock:
+            self._trial_running = False
+
+
+# ======================================================
+# Metrics
+# ======================================================
+class LLMMetrics:
+    """
+    Per-operation latency histogram (cumulative buckets, Prometheus style)
+    and error counts by kind.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._ops = {}
+
+    def _op(self, operation):
+        op = self._ops.get(operation)
+        if op is None:
+            op = {
+                "buckets": [0] * len(self.buckets),
+                "count": 0,
+                "sum": 0.0,
+                "errors": {},
+            }
+            self._ops[operation] = op
+        return op
+
+    def observe(self, operation, seconds, error=None):
+        with self._lock:
+            op = self._op(operation)
+            op["count"] += 1
+            op["sum"] += seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    op["buckets"][i] += 1
+            if error:
+                op["errors"][error] = op["errors"].get(error, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": op["count"],
+                    "sum_s": op["sum"],
+                    "avg_ms": op["sum"] / op["count"] * 1000 if op["count"] else 0.0,
+                    "buckets": dict(zip(self.buckets, op["buckets"])),
+                    "errors": dict(op["errors"]),
+                }
+                for name, op in self._ops.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+
+
+def _error_kind(error):
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, LLMBusy):
+        return "busy"
+    if isinstance(error, DeadlineExceeded):
+        return "deadline"
+    if isinstance(error.__cause__, requests.Timeout):
+        return "timeout"
+    if isinstance(error.__cause__, requests.ConnectionError):
+        return "unavailable"
+    return "error"
+
+
+# ======================================================
+# Guard
+# ======================================================
+class LLMGuard:
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY,
+                 failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.metrics = LLMMetrics()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _enter(self, deadline):
+        """
+        Checks the breaker and waits for a slot. Returns the time left.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM circuit open after repeated failures")
+
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=deadline):
+            self.breaker.release()
+            raise LLMBusy(f"No LLM slot free within {deadline:.1f} s")
+        return deadline - (time.monotonic() - start)
+
+    def _record(self, operation, start, error=None):
+        if error is None:
+            self.breaker.record_success()
+        elif isinstance(error, (CircuitOpen, LLMBusy)):
+            pass        # the model was never called
+        else:
+            self.breaker.record_failure()
+        self.metrics.observe(operation, time.perf_counter() - start,
+                             _error_kind(error) if error else None)
+
+    def generate(self, prompt, operation, deadline, **kwargs):
+        start = time.perf_counter()
+        try:
+            remaining = self._enter(deadline)
+        except LLMError as e:
+            self._record(operation, start, e)
+            raise
+
+        try:
+            text = _generate(prompt, timeout=max(remaining, 0.1), **kwargs)
+        except LLMError as e:
+            self._record(operation, start, e)
+            raise
+        finally:
+            self._slots.release()
+
+        self._record(operation, start)
+        return text
+
+    def generate_stream(self, prompt, operation, deadline, **kwargs):
+        start = time.perf_counter()
+        try:
+            remaining = self._enter(deadline)
+        except LLMError as e:
+            self._record(operation, start, e)
+            raise
+
+        stream = _generate_stream(prompt, timeout=max(remaining, 0.1), **kwargs)
+        ends_at = time.monotonic() + remaining
+        outcome = "cancelled"
+        try:
+            for chunk in stream:
+                yield chunk
+                if time.monotonic() > ends_at:
+                    raise DeadlineExceeded(f"LLM stream exceeded its {deadline:.1f} s deadline")
+            outcome = None
+        except LLMError as e:
+            outcome = e
+            raise
+        finally:
+            stream.close()
+            self._slots.release()
+            if outcome == "cancelled":
+                # consumer stopped reading (e.g. UI rerun): not a model failure
+                self.breaker.release()
+                self.metrics.observe(operation, time.perf_counter() - start, "cancelled")
+            else:
+                self._record(operation, start, outcome)
+
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_guard():
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = LLMGuard()
+    return _guard
+
+
+def generate(prompt, operation, deadline, **kwargs):
+    """
+    llm_client.generate with a deadline, breaker and concurrency limit.
+    `operation` names the call site in the metrics.
+    """
+    return get_guard().generate(prompt, operation, deadline, **kwargs)
+
+
+def generate_stream(prompt, operation, deadline, **kwargs):
+    """
+    llm_client.generate_stream with the same protections; the deadline
+    covers the whole stream.
+    """
+    return get_guard().generate_stream(prompt, operation, deadline, **kwargs)
+
+
+def circuit_state():
+    return get_guard().breaker.state
+
+
+def llm_metrics():
+    """
+    Breaker state plus latency histogram and error counts per operation.
+    """
+    guard = get_guard()
+    return {
+        "circuit": guard.breaker.state,
+        "max_concurrency": guard.max_concurrency,
+        "operations": guard.metrics.snapshot(),
+    }
+
+
+def prometheus_metrics():
+    """
+    The same metrics in Prometheus text exposition format.
+    """
+    guard = get_guard()
+    lines = [
+        "# TYPE llm_request_seconds histogram",
+    ]
+    errors = []
+    for name, op in guard.metrics.snapshot().items():
+        for bound, count in op["buckets"].items():
+            lines.append(f'llm_request_seconds_bucket{{operation="{name}",le="{bound}"}} {count}')
+        lines.append(f'llm_request_seconds_bucket{{operation="{name}",le="+Inf"}} {op["count"]}')
+        lines.append(f'llm_request_seconds_sum{{operation="{name}"}} {op["sum_s"]}')
+        lines.append(f'llm_request_seconds_count{{operation="{name}"}} {op["count"]}')
+        for kind, count in op["errors"].items():
+            errors.append(f'llm_errors_total{{operation="{name}",kind="{kind}"}} {count}')
+
+    lines.append("# TYPE llm_errors_total counter")
+    lines.extend(errors)
+    lines.append("# TYPE llm_circuit_open gauge")
+    lines.append(f"llm_circuit_open {int(guard.breaker.state == 'open')}")
+    return "\n".join(lines) + "\n"
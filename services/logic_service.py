@@ -1,9 +1,32 @@
 import re
 import math
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import islice
+from collections import namedtuple
 
-# Detect dose type
-def detect_dose_type(dosage_text):
-    text = dosage_text.lower()
+import numpy as np
+
+
+# Structured form of a dosage text, produced once at ingest time
+# (services/dosing_ingest.py) or on demand from the text.
+DosingRule = namedtuple("DosingRule", ["dose_type", "low", "high", "max_daily_mg"])
+
+PARSER_CACHE_SIZE = 4096
+
+# Precompiled dosing-text patterns
+NUMBER_RE = re.compile(r"\d+\.?\d*")
+MAX_DAILY_RE = re.compile(r"max(imum)? daily dose[:\s]*([\d\.]+)\s*(mg|g)")
+
+# Renal lines: the GFR condition ends at ":" or where the dose starts
+DOSE_START_RE = re.compile(r"\d+\.?\d*\s*(?:(?:to|-|–)\s*\d+\.?\d*\s*)?(?:mg|mcg|g|units?)\b")
+BSA_NORMALIZED_RE = re.compile(r"/\s*1\.73\s*m(?:2|²)")
+BELOW_WORDS = ("less", "below", "under", "<", "≤")
+ABOVE_WORDS = ("greater", "more", "above", "over", ">", "≥")
+
+
+# The _helpers below expect already lower-cased text
+def _dose_type(text):
     if "mg/kg/day" in text:
         return "MG_KG_DAY"
     if "mg/kg/dose" in text:
@@ -13,10 +36,9 @@ def detect_dose_type(dosage_text):
     return "UNKNOWN"
 
 
-# Extract numeric dose range
-def extract_dose_range(dosage_text):
-    numbers = re.findall(r"\d+\.?\d*", dosage_text)
-    nums = [float(n) for n in numbers]
+def _dose_range(text):
+    # only the first two numbers matter
+    nums = [float(m.group()) for m in islice(NUMBER_RE.finditer(text), 2)]
     if not nums:
         return None
     if len(nums) == 1:
@@ -24,9 +46,8 @@ def extract_dose_range(dosage_text):
     return nums[0], nums[1]
 
 
-# Extract max daily dose (mg)
-def extract_max_daily_dose(dosage_text):
-    match = re.search(r"max(imum)? daily dose[:\s]*([\d\.]+)\s*(mg|g)", dosage_text.lower())
+def _max_daily_dose(text):
+    match = MAX_DAILY_RE.search(text)
     if not match:
         return None
     value = float(match.group(2))
@@ -36,19 +57,63 @@ def extract_max_daily_dose(dosage_text):
     return value
 
 
+# Detect dose type
+def detect_dose_type(dosage_text):
+    return _dose_type(dosage_text.lower())
+
+
+# Extract numeric dose range
+def extract_dose_range(dosage_text):
+    return _dose_range(dosage_text)
+
+
+# Extract max daily dose (mg)
+def extract_max_daily_dose(dosage_text):
+    return _max_daily_dose(dosage_text.lower())
+
+
+# Parse a dosage text into a DosingRule (single pass, memoized on the text)
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def parse_dosing_rule(dosage_text):
+    text = dosage_text.lower()
+    dose_range = _dose_range(text)
+    low, high = dose_range if dose_range else (None, None)
+    return DosingRule(
+        dose_type=_dose_type(text),
+        low=low,
+        high=high,
+        max_daily_mg=_max_daily_dose(text)
+    )
+
+
+def dosing_parser_stats():
+    info = parse_dosing_rule.cache_info()
+    calls = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": info.hits / calls if calls else 0.0,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
 # BSA (Mosteller)
 def calculate_bsa(weight, height):
     return math.sqrt((weight * height) / 3600)
 
 
 # Core pediatric dose calculation
-def calculate_pediatric_dose_base(dosage_text, weight, height=None):
-    dose_type = detect_dose_type(dosage_text)
-    dose_range = extract_dose_range(dosage_text)
-    if not dose_range:
+def calculate_pediatric_dose_base(dosage_text, weight, height=None, rule=None):
+    # pre-parsed rule (from the ingest table) skips the text parsing
+    if rule is None:
+        rule = parse_dosing_rule(dosage_text)
+
+    dose_type = rule.dose_type
+    if rule.low is None:
         return None
 
-    low, high = dose_range
+    low, high = rule.low, rule.high
 
     if dose_type == "MG_KG_DAY":
         daily_low = low * weight
@@ -73,7 +138,7 @@ def calculate_pediatric_dose_base(dosage_text, weight, height=None):
         return None
 
     # apply max daily dose if present
-    max_daily = extract_max_daily_dose(dosage_text)
+    max_daily = rule.max_daily_mg
     if max_daily:
         daily_low = min(daily_low, max_daily)
         daily_high = min(daily_high, max_daily)
@@ -93,28 +158,256 @@ def divide_daily_dose(daily_low, daily_high, interval_hours):
 
 
 # ======================================================
-# Renal Selector
+# Batch (vectorized) calculation
 # ======================================================
-def select_renal_dose(renal_text: str, gfr: float):
-    if not renal_text:
+def calculate_pediatric_dose_batch(rule, weights, heights=None, interval_hours=None):
+    """
+    Vectorized calculate_pediatric_dose_base (+ divide_daily_dose) for many
+    patients sharing one DosingRule.
+
+    weights / heights / interval_hours: scalars or arrays (NumPy / pandas).
+    Returns None where the scalar path returns None, otherwise a dict of
+    float64 arrays with the same keys as the scalar result; with
+    interval_hours, "doses_per_day" and "per_dose_mg" are added.
+    Rows with a missing (NaN) height give NaN for mg/m² rules.
+    """
+    if rule is None or rule.low is None:
         return None
 
-    lines = renal_text.split("\n")
+    weights = np.asarray(weights, dtype=np.float64)
+    low, high = rule.low, rule.high
 
-    for line in lines:
-        numbers = [float(n) for n in re.findall(r"\d+\.?\d*", line)]
+    if rule.dose_type == "MG_KG_DOSE":
+        return {
+            "dose_type": rule.dose_type,
+            "per_dose_mg": (low * weights, high * weights)
+        }
+
+    if rule.dose_type == "MG_KG_DAY":
+        daily_low = low * weights
+        daily_high = high * weights
+
+    elif rule.dose_type == "MG_M2_DAY":
+        if heights is None:
+            return None
+        heights = np.asarray(heights, dtype=np.float64)
+        bsa = np.sqrt((weights * heights) / 3600)
+        daily_low = low * bsa
+        daily_high = high * bsa
+
+    else:
+        return None
+
+    # apply max daily dose if present
+    max_daily = rule.max_daily_mg
+    if max_daily:
+        daily_low = np.minimum(daily_low, max_daily)
+        daily_high = np.minimum(daily_high, max_daily)
+
+    result = {
+        "dose_type": rule.dose_type,
+        "daily_dose_mg": (daily_low, daily_high)
+    }
+
+    if interval_hours is not None:
+        interval_hours = np.asarray(interval_hours, dtype=np.float64)
+        doses_per_day, per_dose_low, per_dose_high = divide_daily_dose(
+            daily_low, daily_high, interval_hours
+        )
+        result["doses_per_day"] = doses_per_day
+        result["per_dose_mg"] = (per_dose_low, per_dose_high)
+
+    return result
+
+
+# ======================================================
+# Renal Selector
+# ======================================================
+def split_renal_line(line):
+    """
+    Splits a renal line into its GFR condition and its dose text
+    ("gfr less than 10: 50 to 100 mg/kg/dose ..." -> "gfr less than 10",
+    "50 to 100 mg/kg/dose ..."), so GFR bounds and dose numbers are never
+    read from each other's part of the line.
+    """
+    if ":" in line:
+        condition, dose_text = line.split(":", 1)
+    else:
+        condition, dose_text = line, ""
+
+    dose = DOSE_START_RE.search(condition)
+    if dose:
+        condition, dose_text = condition[:dose.start()], condition[dose.start():] + dose_text
+
+    return BSA_NORMALIZED_RE.sub("", condition), dose_text.strip()
+
+
+def parse_renal_bands(renal_text: str):
+    """
+    Parses renal dosing text into GFR bands, in text order.
+    Each band: {"kind": "range" | "below" | "above", "low", "high", "text", "dosing"}
+    """
+    bands = []
+    if not renal_text:
+        return bands
+
+    for line in renal_text.split("\n"):
+        condition, dose_text = split_renal_line(line.lower())
+        numbers = [float(n) for n in NUMBER_RE.findall(condition)]
+        dosing = parse_dosing_rule(dose_text)
 
         if len(numbers) >= 2:
-            low, high = numbers[0], numbers[1]
-            if low <= gfr <= high:
-                return line
+            bands.append({"kind": "range", "low": numbers[0], "high": numbers[1],
+                          "text": line, "dosing": dosing})
 
         elif len(numbers) == 1:
-            if "less" in line.lower() or "<" in line:
-                if gfr < numbers[0]:
-                    return line
-            if "greater" in line.lower() or ">" in line:
-                if gfr > numbers[0]:
-                    return line
-
-    return None
\ No newline at end of file
+            if any(word in condition for word in BELOW_WORDS):
+                bands.append({"kind": "below", "low": None, "high": numbers[0],
+                              "text": line, "dosing": dosing})
+            if any(word in condition for word in ABOVE_WORDS):
+                bands.append({"kind": "above", "low": numbers[0], "high": None,
+                              "text": line, "dosing": dosing})
+
+    return bands
+
+
+def select_renal_band(bands, gfr: float):
+    """
+    First band matching the GFR (same rules as select_renal_dose).
+    """
+    for band in bands:
+        if band["kind"] == "range":
+            if band["low"] <= gfr <= band["high"]:
+                return band
+        elif band["kind"] == "below":
+            if gfr < band["high"]:
+                return band
+        elif band["kind"] == "above":
+            if gfr > band["low"]:
+                return band
+
+    return None
+
+
+class RenalBandIndex:
+    """
+    GFR -> renal band lookup in O(log n).
+
+    The band bounds split the GFR axis into sorted, non-overlapping pieces
+    (each bound itself, the open gaps between bounds and the open-ended
+    "<" / ">" ends). Each piece is resolved once to the first band that
+    matches it, so lookups give exactly the same answer as the linear
+    first-match scan in select_renal_band.
+    """
+
+    def __init__(self, bands):
+        self.bands = list(bands)
+
+        points = set()
+        for band in self.bands:
+            for bound in (band["low"], band["high"]):
+                if bound is not None:
+                    points.add(bound)
+        self.points = sorted(points)
+
+        # pieces: (-inf, p0), {p0}, (p0, p1), {p1}, ..., {pk}, (pk, inf)
+        self._piece_bands = []
+        for i in range(2 * len(self.points) + 1):
+            band = select_renal_band(self.bands, self._representative(i))
+            self._piece_bands.append(band)
+
+        self._points_array = np.asarray(self.points, dtype=np.float64)
+        self._band_ids = np.asarray(
+            [-1 if band is None else self._position(band) for band in self._piece_bands],
+            dtype=np.int64
+        )
+
+    def _position(self, band):
+        return next(i for i, b in enumerate(self.bands) if b is band)
+
+    def _representative(self, piece):
+        points = self.points
+        if not points:
+            return 0.0
+        if piece % 2 == 1:
+            return points[piece // 2]
+        i = piece // 2
+        if i == 0:
+            return points[0] - 1
+        if i == len(points):
+            return points[-1] + 1
+        return (points[i - 1] + points[i]) / 2
+
+    def select(self, gfr):
+        """
+        Band for one GFR value (None when nothing matches).
+        """
+        if gfr != gfr:      # NaN matches nothing
+            return None
+        i = bisect_left(self.points, gfr)
+        exact = i < len(self.points) and self.points[i] == gfr
+        return self._piece_bands[2 * i + exact]
+
+    def select_many(self, gfrs):
+        """
+        Bands for an array of GFR values (list aligned with `gfrs`).
+        """
+        gfrs = np.asarray(gfrs, dtype=np.float64)
+        points = self._points_array
+
+        i = np.searchsorted(points, gfrs, side="left")
+        if len(points):
+            exact = (i < len(points)) & (points[np.minimum(i, len(points) - 1)] == gfrs)
+        else:
+            exact = np.zeros(gfrs.shape, dtype=bool)
+
+        band_ids = self._band_ids[2 * i + exact]
+        band_ids[np.isnan(gfrs)] = -1
+
+        return [None if b < 0 else self.bands[b] for b in band_ids.tolist()]
+
+    def intervals(self):
+        """
+        Merged (low, high, low_closed, high_closed, band) intervals, low to high.
+        """
+        merged = []
+        for piece, band in enumerate(self._piece_bands):
+            if band is None:
+                continue
+            i = piece // 2
+            if piece % 2 == 1:
+                low = high = self.points[i]
+                low_closed = high_closed = True
+            else:
+                low = self.points[i - 1] if i > 0 else float("-inf")
+                high = self.points[i] if i < len(self.points) else float("inf")
+                low_closed = high_closed = False
+
+            if merged and merged[-1][4] is band and merged[-1][1] == low:
+                merged[-1] = (merged[-1][0], high, merged[-1][2], high_closed, band)
+            else:
+                merged.append((low, high, low_closed, high_closed, band))
+        return merged
+
+    def __len__(self):
+        return len(self.bands)
+
+
+@lru_cache(maxsize=256)
+def get_renal_index(renal_text: str):
+    """
+    RenalBandIndex for a renal dosing text, built once per distinct text.
+    """
+    return RenalBandIndex(parse_renal_bands(renal_text))
+
+
+def select_renal_dose(renal_text: str, gfr: float, bands=None):
+    if bands is not None:
+        band = select_renal_band(bands, gfr)
+        return band["text"] if band else None
+
+    if not renal_text:
+        return None
+
+    band = get_renal_index(renal_text).select(gfr)
+    return band["text"] if band else None
@@ -1,22 +1,26 @@
-from .reference_service import get_drug_reference
+import sys
+import argparse
+
 from .logic_service import (
     calculate_pediatric_dose_base,
     divide_daily_dose
 )
 from .ai_input_service import extract_drug_and_indication_from_text
-from .preparation_pipeline import extract_reconstitution
+from .preparation_pipeline import extract_reconstitution, ai_cross_check_result, ai_cross_check_failed
 from .safety_service import (
     generate_safety_flags,
     format_safety_comment
 )
-
-
-# Shared variables
-
-pl = ph = None          # dose per administration (mg)
-dl = dh = None          # daily dose (mg/day)
-interval_hours = None
-renal_active = False
+from .dosing_pipeline import (
+    DosingError,
+    lookup_reference,
+    needs_height,
+    renal_dose,
+    renal_band,
+    is_unadjusted_band,
+    reconstitute
+)
+from .batch_service import run_batch
 
 
 def section(title):
@@ -25,215 +29,237 @@ def section(title):
     print("=" * 50)
 
 
+def run_interactive():
 
-# App start
+    # Shared variables
 
-print("\nPEDIATRIC DRUG DOSING ASSISTANT")
-print("-" * 50)
+    pl = ph = None          # dose per administration (mg)
+    dl = dh = None          # daily dose (mg/day)
+    interval_hours = None
+    renal_active = False
 
 
-# Clinical query
+    # App start
 
-print("\nEnter clinical query:")
-query = input("> ")
+    print("\nPEDIATRIC DRUG DOSING ASSISTANT")
+    print("-" * 50)
 
-drug, indication = extract_drug_and_indication_from_text(query)
 
-if not drug or not indication:
-    print("❌ Could not understand the clinical query.")
-    exit()
+    # Clinical query
 
-print(f"\nDetected drug: {drug}")
-print(f"Detected indication: {indication}")
+    print("\nEnter clinical query:")
+    query = input("> ")
 
+    drug, indication = extract_drug_and_indication_from_text(query)
 
-# Get reference
+    if not drug or not indication:
+        print("❌ Could not understand the clinical query.")
+        exit()
 
-ref = get_drug_reference(drug, indication)
+    print(f"\nDetected drug: {drug}")
+    print(f"Detected indication: {indication}")
 
-if not ref:
-    print("❌ No reference found.")
-    exit()
 
-section("Dosage Reference")
-print(ref["dosage"])
+    # Get reference
 
+    try:
+        ref = lookup_reference(drug, indication)
+    except DosingError:
+        print("❌ No reference found.")
+        exit()
 
-# Patient parameters
+    section("Dosage Reference")
+    print(ref["dosage"])
 
-weight = float(input("\nEnter patient weight (kg): "))
 
-height = None
-if "mg/m2" in ref["dosage"].lower() or "mg/m²" in ref["dosage"].lower():
-    height = float(input("Enter patient height (cm): "))
+    # Patient parameters
 
+    weight = float(input("\nEnter patient weight (kg): "))
 
-# Renal decision
+    height = None
+    if needs_height(ref):
+        height = float(input("Enter patient height (cm): "))
 
-renal_active = False
-gfr_value = None
 
-renal_choice = input(
-    "\nIs renal impairment present? (y/n): "
-).strip().lower()
+    # Renal decision
 
-if renal_choice == "y":
-    renal_active = True
-    gfr_value = float(
-        input("If yes, enter patient GFR (mL/min/1.73 m²): ")
-    )
+    renal_active = False
+    gfr_value = None
 
+    renal_choice = input(
+        "\nIs renal impairment present? (y/n): "
+    ).strip().lower()
 
+    if renal_choice == "y":
+        renal_active = True
+        gfr_value = float(
+            input("If yes, enter patient GFR (mL/min/1.73 m²): ")
+        )
 
 
-# Dose calculation
+    # Dose calculation
 
-section("Dose Calculation")
+    section("Dose Calculation")
 
-# ---------- RENAL DOSING PATH ----------
-if renal_active:
-    print("\nReference dosing used (renal):")
-    print(ref["renal_adjustment_dose"])
+    # bands such as "GFR greater than 50: no adjustment" keep standard dosing
+    if renal_active:
+        band = renal_band(ref, gfr_value)
+        if band and is_unadjusted_band(band):
+            print(f"\nMatching renal band: {band['text']} → standard dosing")
+            renal_active = False
 
-    import re
+    # ---------- RENAL DOSING PATH ----------
+    if renal_active:
+        print("\nReference dosing used (renal):")
+        print(ref["renal_adjustment_dose"])
 
-    text = ref["renal_adjustment_dose"].lower()
+        # same GFR band index as the Streamlit app
+        try:
+            renal = renal_dose(ref, gfr_value, weight)
+        except DosingError as e:
+            print(f"❌ {e}")
+            exit()
 
-    # استخراج GFR range
-    gfr_match = re.search(r"gfr\s*(\d+)\s*to\s*(\d+)", text)
-    if not gfr_match:
-        print("❌ Could not extract GFR range from renal reference.")
-        exit()
+        print(f"Matching renal band: {renal['renal_band']}")
 
-    gfr_low = float(gfr_match.group(1))
-    gfr_high = float(gfr_match.group(2))
+        pl, ph = renal["per_dose_mg"]
+        interval_hours = renal["interval_hours"]
 
-    # check GFR applicability
-    if not (gfr_low <= gfr_value <= gfr_high):
-        print(f"❌ Renal reference applies to GFR {gfr_low}–{gfr_high}.")
-        print(f"Patient GFR = {gfr_value}. No matching renal dosing available.")
-        exit()
+        print(f"Dose per administration: {pl:.2f} – {ph:.2f} mg")
+        if interval_hours:
+            print(f"Dosing interval: every {interval_hours} hours")
 
-    dose_match = re.search(
-    r"(\d+)\s*to\s*(\d+)\s*mg/kg/dose",
-    text
-)
 
-    if not dose_match:
-        print("❌ Could not extract renal dose (mg/kg/dose).")
-        exit()
+    # ---------- STANDARD PATH ----------
+    else:
+        print("\nReference dosing used:")
+        print(ref["dosage"])
 
-    dose_low = float(dose_match.group(1))
-    dose_high = float(dose_match.group(2))
+        base_result = calculate_pediatric_dose_base(
+            dosage_text=ref["dosage"],
+            weight=weight,
+            height=height,
+            rule=ref["parsed"]["dosing"] if ref.get("parsed") else None
+        )
 
+        if not base_result:
+            print("❌ Dose calculation failed.")
+            exit()
 
-    
+        if base_result["dose_type"] == "MG_KG_DOSE":
+            pl, ph = base_result["per_dose_mg"]
+            print(f"Dose per administration: {pl:.2f} – {ph:.2f} mg")
 
-    interval_match = re.search(r"every\s+(\d+)", text)
-    interval_hours = int(interval_match.group(1)) if interval_match else None
+        else:
+            dl, dh = base_result["daily_dose_mg"]
+            print(f"Total daily dose: {dl:.2f} – {dh:.2f} mg/day")
 
-    pl = weight * dose_low
-    ph = weight * dose_high
+            interval_hours = float(input("Enter dosing interval (hours): "))
+            doses_per_day, pl, ph = divide_daily_dose(dl, dh, interval_hours)
 
-    print(f"Dose per administration: {pl:.2f} – {ph:.2f} mg")
-    if interval_hours:
-        print(f"Dosing interval: every {interval_hours} hours")
+            print(f"Doses per day: {int(doses_per_day)}")
+            print(f"Dose per administration: {pl:.2f} – {ph:.2f} mg")
 
 
-# ---------- STANDARD PATH ----------
-else:
-    print("\nReference dosing used:")
-    print(ref["dosage"])
+    # Administration
 
-    base_result = calculate_pediatric_dose_base(
-        dosage_text=ref["dosage"],
-        weight=weight,
-        height=height
-    )
+    section("Administration")
+    print(ref["administration"])
 
-    if not base_result:
-        print("❌ Dose calculation failed.")
-        exit()
 
-    if base_result["dose_type"] == "MG_KG_DOSE":
-        pl, ph = base_result["per_dose_mg"]
-        print(f"Dose per administration: {pl:.2f} – {ph:.2f} mg")
+    # Reconstitution / Preparation
 
-    else:
-        dl, dh = base_result["daily_dose_mg"]
-        print(f"Total daily dose: {dl:.2f} – {dh:.2f} mg/day")
+    section("Reconstitution")
 
-        interval_hours = float(input("Enter dosing interval (hours): "))
-        doses_per_day, pl, ph = divide_daily_dose(dl, dh, interval_hours)
+    # precomputed AI cross-check, or a live one while the user picks a vial
+    prep_data = extract_reconstitution(
+        ref["preparation"],
+        parsed=ref["parsed"]["preparation"] if ref.get("parsed") else None,
+        ai_check="store"
+    )
 
-        print(f"Doses per day: {int(doses_per_day)}")
-        print(f"Dose per administration: {pl:.2f} – {ph:.2f} mg")
+    if prep_data and prep_data.get("reconstitution"):
+        recon_list = prep_data["reconstitution"]
 
+        print("Available reconstitution options from reference:")
+        for item in recon_list:
+            print(f"- {item['vial_mg']} mg vial → add {item['volume_ml']} mL")
 
-# Administration
+        try:
+            vial_strength = int(input("Select vial strength (mg): "))
+        except ValueError:
+            vial_strength = None
 
-section("Administration")
-print(ref["administration"])
+        prep = reconstitute(prep_data, vial_strength, pl, ph)
 
+        if prep:
+            print(f"\nResulting concentration: {prep['concentration_mg_ml']:.2f} mg/mL")
 
-# Reconstitution / Preparation
+            volume_low, volume_high = prep["withdraw_volume_ml"]
 
-section("Reconstitution")
+            print(f"Volume to withdraw per dose: {volume_low:.2f} – {volume_high:.2f} mL")
 
-prep_data = extract_reconstitution(ref["preparation"])
+            if prep["dilution_required"]:
+                print("\n⚠ WARNING:")
+                print(f"Concentration exceeds recommended maximum ({prep['max_concentration_mg_ml']} mg/mL).")
+                print("Further dilution is required before administration.")
+        else:
+            print("⚠ Selected vial strength not found in reference data.")
 
-if prep_data and prep_data.get("reconstitution"):
-    recon_list = prep_data["reconstitution"]
-    max_conc = prep_data.get("max_concentration_mg_ml")
+        if ai_cross_check_result(ref["preparation"]):
+            print("\n⚠ AI cross-check disagrees with the extracted reconstitution data.")
+            print("Verify against the reference preparation text.")
+        elif ai_cross_check_failed(ref["preparation"]):
+            print("\n⚠ AI cross-check unavailable (model not reachable).")
+            print("Verify against the reference preparation text.")
 
-    print("Available reconstitution options from reference:")
-    for item in recon_list:
-        print(f"- {item['vial_mg']} mg vial → add {item['volume_ml']} mL")
+    else:
+        print("⚠ AI could not extract reconstitution data from reference.")
+        print("Please refer to preparation instructions manually.")
 
-    try:
-        vial_strength = int(input("Select vial strength (mg): "))
-    except ValueError:
-        vial_strength = None
 
-    selected = next(
-        (x for x in recon_list if x["vial_mg"] == vial_strength),
-        None
-    )
+    # Safety check
 
-    if selected:
-        concentration = selected["vial_mg"] / selected["volume_ml"]
-        print(f"\nResulting concentration: {concentration:.2f} mg/mL")
+    print("\n--- SAFETY COMMENT ---")
 
-        volume_low = pl / concentration
-        volume_high = ph / concentration
+    flags = generate_safety_flags(
+        daily_dose_mg=dh if not renal_active else None,
+        max_daily_dose_mg=None,
+        dose_per_administration_mg=ph,
+        withdrawal_volume_ml=None
+    )
 
-        print(f"Volume to withdraw per dose: {volume_low:.2f} – {volume_high:.2f} mL")
 
-        if max_conc and concentration > max_conc:
-            print("\n⚠ WARNING:")
-            print(f"Concentration exceeds recommended maximum ({max_conc} mg/mL).")
-            print("Further dilution is required before administration.")
-    else:
-        print("⚠ Selected vial strength not found in reference data.")
 
-else:
-    print("⚠ AI could not extract reconstitution data from reference.")
-    print("Please refer to preparation instructions manually.")
+    comments = format_safety_comment(flags)
+    for c in comments:
+        print(c)
 
 
-# Safety check
+def main():
+    parser = argparse.ArgumentParser(description="Pediatric drug dosing assistant.")
+    parser.add_argument("--batch", metavar="ORDERS",
+                        help="CSV / JSONL file of orders to process non-interactively")
+    parser.add_argument("--output", metavar="RESULTS",
+                        help="results file (.jsonl or .csv); default: JSONL on stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"],
+                        help="output format (default: from the --output extension)")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
 
-print("\n--- SAFETY COMMENT ---")
+    if not args.batch:
+        run_interactive()
+        return
 
-flags = generate_safety_flags(
-    daily_dose_mg=dh if not renal_active else None,
-    max_daily_dose_mg=None,
-    dose_per_administration_mg=ph,
-    withdrawal_volume_ml=None
-)
+    summary = run_batch(args.batch, args.output, workers=args.workers,
+                        output_format=args.format)
 
+    print(
+        f"[OK] {summary['records']} records | {summary['ok']} ok | "
+        f"{summary['errors']} errors | {summary['elapsed_s']:.1f} s",
+        file=sys.stderr
+    )
 
 
-comments = format_safety_comment(flags)
-for c in comments:
-    print(c)
+if __name__ == "__main__":
+    main()
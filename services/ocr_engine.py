@@ -0,0 +1,260 @@
+"""
+OCR engine for vial labels: a pool of long-lived Tesseract workers.
+
+Each pool thread keeps its own Tesseract instance alive, so language data
+is loaded once per worker instead of once per image:
+
+    tesserocr    in-process C API (pip install tesserocr); releases the GIL,
+                 so the workers run in parallel
+    pytesseract  fallback when tesserocr is not installed; still one
+                 `tesseract` process per image, but bounded by the pool
+
+The pool is sized to the core count, has a bounded queue (OCRBusy when it
+is full) and a per-image timeout (OCRTimeout).
+
+Environment:
+    TESSERACT_CMD        tesseract executable for the pytesseract fallback
+    CLINICAL_OCR_ENGINE  "tesserocr" or "pytesseract" (default: best available)
+    CLINICAL_OCR_WORKERS pool size (default: os.cpu_count())
+    CLINICAL_OCR_LANG    Tesseract language (default: eng)
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# one Tesseract thread per worker; the pool provides the parallelism
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+import pytesseract
+
+
+WINDOWS_TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD") or (
+    WINDOWS_TESSERACT_CMD if os.name == "nt" and os.path.exists(WINDOWS_TESSERACT_CMD)
+    else "tesseract"
+)
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+OCR_ENGINE = os.environ.get("CLINICAL_OCR_ENGINE") or ("tesserocr" if tesserocr else "pytesseract")
+OCR_WORKERS = int(os.environ.get("CLINICAL_OCR_WORKERS", "0")) or os.cpu_count() or 1
+OCR_LANG = os.environ.get("CLINICAL_OCR_LANG", "eng")
+OCR_QUEUE_SIZE = 4 * OCR_WORKERS
+OCR_TIMEOUT = 15.0              # seconds per image
+PSM = 6                         # assume a single uniform block of text
+
+
+class OCRError(Exception):
+    """Tesseract failed on an image."""
+
+
+class OCRTimeout(OCRError):
+    """Recognition did not finish within the per-image timeout."""
+
+
+class OCRBusy(OCRError):
+    """The OCR queue is full."""
+
+
+# ======================================================
+# Workers (one per pool thread, kept for the thread's lifetime)
+# ======================================================
+class TesserocrWorker:
+    """
+    In-process Tesseract instance; language data stays loaded.
+    """
+
+    def __init__(self, lang=OCR_LANG, psm=PSM):
+        self.psm = psm
+        try:
+            self.api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+        except RuntimeError as e:
+            # usually missing language data (TESSDATA_PREFIX)
+            raise OCRError(f"Could not start Tesseract: {e}") from e
+
+    def recognize(self, gray, timeout, psm=None):
+        self.api.SetPageSegMode(psm or self.psm)
+        self.api.SetImage(Image.fromarray(gray))
+        if not self.api.Recognize(timeout=int(timeout * 1000)):
+            self.api.Clear()
+            raise OCRTimeout(f"OCR exceeded {timeout:g} s")
+        text = self.api.GetUTF8Text()
+        self.api.Clear()
+        return text
+
+    def close(self):
+        self.api.End()
+
+
+class PytesseractWorker:
+    """
+    Runs the tesseract executable once per image (fallback).
+    """
+
+    def __init__(self, lang=OCR_LANG, psm=PSM):
+        self.lang = lang
+        self.psm = psm
+
+    def recognize(self, gray, timeout, psm=None):
+        try:
+            return pytesseract.image_to_string(
+                gray, lang=self.lang, config=f"--psm {psm or self.psm}", timeout=timeout
+            )
+        except (pytesseract.TesseractError, pytesseract.TesseractNotFoundError) as e:
+            # TesseractError is a RuntimeError too, so it is caught first
+            raise OCRError(str(e)) from e
+        except RuntimeError as e:
+            # pytesseract signals its timeout as a plain RuntimeError
+            if "timeout" not in str(e).lower():
+                raise OCRError(str(e)) from e
+            raise OCRTimeout(f"OCR exceeded {timeout:g} s") from e
+
+    def close(self):
+        pass
+
+
+WORKERS = {
+    "tesserocr": TesserocrWorker,
+    "pytesseract": PytesseractWorker,
+}
+
+
+# ======================================================
+# Pool
+# ======================================================
+class OCRPool:
+    """
+    Fixed pool of OCR workers behind a bounded queue.
+    """
+
+    def __init__(self, engine=OCR_ENGINE, workers=OCR_WORKERS,
+                 queue_size=OCR_QUEUE_SIZE, timeout=OCR_TIMEOUT):
+        if engine not in WORKERS:
+            raise ValueError(f"Unknown OCR engine: {engine}")
+        if engine == "tesserocr" and tesserocr is None:
+            raise ValueError("tesserocr is not installed")
+
+        self.engine = engine
+        self.workers = workers
+        self.timeout = timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._local = threading.local()
+        self._all_workers = []
+
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "errors": 0, "timeouts": 0, "rejected": 0,
+                       "ocr_time_s": 0.0}
+
+    def _worker(self):
+        worker = getattr(self._local, "worker", None)
+        if worker is None:
+            worker = WORKERS[self.engine]()
+            self._local.worker = worker
+            with self._lock:
+                self._all_workers.append(worker)
+        return worker
+
+    def _run(self, gray, timeout, psm):
+        start = time.perf_counter()
+        error = None
+        try:
+            return self._worker().recognize(gray, timeout, psm)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._slots.release()
+            with self._lock:
+                self._stats["images"] += 1
+                self._stats["ocr_time_s"] += time.perf_counter() - start
+                if isinstance(error, OCRTimeout):
+                    self._stats["timeouts"] += 1
+                elif error is not None:
+                    self._stats["errors"] += 1
+
+    def submit(self, gray, timeout=None, block=True, psm=None):
+        """
+        Queues one grayscale image; returns a Future with the text.
+        Blocks while the queue is full (block=False raises OCRBusy instead).
+        psm overrides the page segmentation mode for this image.
+        """
+        if not self._slots.acquire(blocking=block):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise OCRBusy("OCR queue is full")
+        try:
+            return self._executor.submit(self._run, gray, timeout or self.timeout, psm)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def recognize(self, gray, timeout=None, psm=None):
+        """
+        OCR of one grayscale image. The timeout covers queueing and recognition.
+        """
+        timeout = timeout or self.timeout
+        future = self.submit(gray, timeout, block=False, psm=psm)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout as e:
+            if future.cancel():
+                # still queued: _run never runs, so give its slot back here
+                self._slots.release()
+            raise OCRTimeout(f"OCR exceeded {timeout:g} s") from e
+
+    def recognize_many(self, images, timeout=None, psm=None):
+        """
+        OCR of many grayscale images on all workers, results in input order.
+        Failed images give None.
+        """
+        futures = [self.submit(gray, timeout, psm=psm) for gray in images]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except OCRError:
+                results.append(None)
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["engine"] = self.engine
+        stats["workers"] = self.workers
+        stats["avg_ocr_ms"] = stats["ocr_time_s"] / stats["images"] * 1000 if stats["images"] else 0.0
+        return stats
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for worker in self._all_workers:
+                worker.close()
+            self._all_workers.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OCRPool()
+    return _pool
+
+
+def ocr_stats():
+    return get_ocr_pool().stats()
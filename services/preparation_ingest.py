@@ -0,0 +1,197 @@
+"""
+Offline job: reconstitution data and the AI cross-check for every distinct
+preparation text, stored in drug_preparation_check
+(database/migrations/003_drug_preparation_check.sql).
+
+The rule-based parser and the AI extractor run once per text, in parallel
+across texts; extract_reconstitution(..., ai_check="store") then serves the
+stored result instead of calling the model.
+
+    python -m services.preparation_ingest              # new / changed texts
+    python -m services.preparation_ingest --full       # re-check everything
+    OLLAMA_MAX_CONCURRENCY=4 python -m services.preparation_ingest --workers 4
+"""
+
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from .llm_client import DEFAULT_MODEL
+from .llm_guard import MAX_CONCURRENCY
+from .preparation_service import rule_based_reconstitution
+from .ai_preparation_service import extract_reconstitution_ai
+
+
+# bump when the rule parser or the AI prompt changes so texts are re-checked
+EXTRACTOR_VERSION = 1
+
+DEFAULT_WORKERS = MAX_CONCURRENCY      # more workers would only queue on the guard
+
+
+def preparation_hash(preparation_text):
+    """
+    Same value as md5(coalesce(preparation_for_administration, '')) in Postgres.
+    """
+    return hashlib.md5((preparation_text or "").encode("utf-8")).hexdigest()
+
+
+def check_preparation(preparation_text):
+    """
+    Rule-based and AI extraction of one preparation text.
+    Raises if the model fails, so failures are retried on the next run
+    instead of being stored as "no discrepancy".
+    """
+    rule_data = rule_based_reconstitution(preparation_text or "")
+    ai_data = extract_reconstitution_ai(preparation_text or "", strict=True)
+
+    discrepancy = bool(ai_data["reconstitution"]) and (
+        ai_data["reconstitution"] != rule_data["reconstitution"]
+    )
+
+    return {
+        "reconstitution": rule_data["reconstitution"],
+        "max_concentration_mg_ml": rule_data["max_concentration_mg_ml"],
+        "dilution_only": rule_data["dilution_only"],
+        "ai_reconstitution": ai_data["reconstitution"],
+        "ai_max_concentration_mg_ml": ai_data["max_concentration_mg_ml"],
+        "ai_discrepancy": discrepancy,
+    }
+
+
+def load_preparation_checks():
+    """
+    All stored checks of the current extractor version, keyed on prep_hash.
+    """
+    from .db_connection import connection
+
+    query = """
+    SELECT prep_hash, reconstitution, max_concentration_mg_ml,
+           dilution_only, ai_discrepancy
+    FROM drug_preparation_check
+    WHERE extractor_version = %s;
+    """
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, (EXTRACTOR_VERSION,))
+            rows = cursor.fetchall()
+
+    return {
+        prep_hash: {
+            "reconstitution": reconstitution,
+            "max_concentration_mg_ml": max_conc,
+            "dilution_only": dilution_only,
+            "ai_discrepancy": discrepancy,
+        }
+        for prep_hash, reconstitution, max_conc, dilution_only, discrepancy in rows
+    }
+
+
+def ingest(full=False, workers=DEFAULT_WORKERS):
+    """
+    Checks preparation texts that have no current row and removes rows whose
+    text no longer exists. Returns (checked, failed, removed).
+    """
+    from psycopg2.extras import execute_values
+    from .db_connection import connection
+
+    select_query = """
+    SELECT DISTINCT ON (d.prep_hash) d.prep_hash, d.preparation
+    FROM (
+        SELECT md5(coalesce(preparation_for_administration, '')) AS prep_hash,
+               preparation_for_administration AS preparation
+        FROM drug_reference
+    ) d
+    LEFT JOIN drug_preparation_check c ON c.prep_hash = d.prep_hash
+    WHERE %s OR c.prep_hash IS NULL OR c.extractor_version <> %s;
+    """
+
+    upsert_query = """
+    INSERT INTO drug_preparation_check (
+        prep_hash, extractor_version, model,
+        reconstitution, max_concentration_mg_ml, dilution_only,
+        ai_reconstitution, ai_max_concentration_mg_ml, ai_discrepancy
+    )
+    VALUES %s
+    ON CONFLICT (prep_hash) DO UPDATE SET
+        extractor_version = EXCLUDED.extractor_version,
+        model = EXCLUDED.model,
+        reconstitution = EXCLUDED.reconstitution,
+        max_concentration_mg_ml = EXCLUDED.max_concentration_mg_ml,
+        dilution_only = EXCLUDED.dilution_only,
+        ai_reconstitution = EXCLUDED.ai_reconstitution,
+        ai_max_concentration_mg_ml = EXCLUDED.ai_max_concentration_mg_ml,
+        ai_discrepancy = EXCLUDED.ai_discrepancy,
+        checked_at = now();
+    """
+
+    cleanup_query = """
+    DELETE FROM drug_preparation_check c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM drug_reference d
+        WHERE md5(coalesce(d.preparation_for_administration, '')) = c.prep_hash
+    );
+    """
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(select_query, (full, EXTRACTOR_VERSION))
+            rows = cursor.fetchall()
+        conn.commit()
+
+    # the model calls dominate; no connection is held while they run
+    def run(row):
+        prep_hash, preparation = row
+        try:
+            return prep_hash, check_preparation(preparation)
+        except Exception:
+            return prep_hash, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, rows))
+
+    values = [
+        (
+            prep_hash,
+            EXTRACTOR_VERSION,
+            DEFAULT_MODEL,
+            json.dumps(check["reconstitution"]),
+            check["max_concentration_mg_ml"],
+            check["dilution_only"],
+            json.dumps(check["ai_reconstitution"]),
+            check["ai_max_concentration_mg_ml"],
+            check["ai_discrepancy"],
+        )
+        for prep_hash, check in results
+        if check is not None
+    ]
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            if values:
+                execute_values(cursor, upsert_query, values)
+
+            cursor.execute(cleanup_query)
+            removed = cursor.rowcount
+
+        conn.commit()
+
+    return len(values), len(results) - len(values), removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute reconstitution data and the AI cross-check.")
+    parser.add_argument("--full", action="store_true", help="re-check every preparation text")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parallel model calls")
+    args = parser.parse_args()
+
+    checked, failed, removed = ingest(full=args.full, workers=args.workers)
+    print(
+        f"[OK] drug_preparation_check: {checked} texts checked | "
+        f"{failed} failed (retried next run) | {removed} stale rows removed"
+    )
+
+
+if __name__ == "__main__":
+    main()
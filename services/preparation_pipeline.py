@@ -1,24 +1,207 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from .ai_preparation_service import extract_reconstitution_ai
 from .preparation_service import rule_based_reconstitution
+from .preparation_ingest import preparation_hash, load_preparation_checks
+from .reference_service import get_reference_backend
+
+
+# =====================================================
+# AI CROSS-CHECK (background)
+# =====================================================
+
+AI_CHECK_WORKERS = 2
+AI_CHECK_CACHE_SIZE = 512       # distinct preparation texts kept in memory
+AI_CHECK_RETRY_AFTER = 60.0     # seconds before a failed check is retried
+
+_executor = None
+_checks = {}                    # preparation text -> Future[bool]
+_failed_at = {}                 # preparation text -> monotonic time of the failure
+_checks_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=AI_CHECK_WORKERS,
+            thread_name_prefix="ai-recon-check"
+        )
+    return _executor
+
+
+def _has_discrepancy(rule_data, ai_data):
+    if ai_data and ai_data.get("reconstitution"):
+        return ai_data["reconstitution"] != rule_data["reconstitution"]
+    return False
+
+
+def _cross_check(preparation_text, rule_data):
+    # strict: an unavailable model must not read as "no discrepancy"
+    ai_data = extract_reconstitution_ai(preparation_text, strict=True)
+    return _has_discrepancy(rule_data, ai_data)
+
+
+def _sync_cross_check(preparation_text, rule_data):
+    try:
+        return _cross_check(preparation_text, rule_data)
+    except Exception:
+        return None
+
+
+def start_ai_cross_check(preparation_text, rule_data):
+    """
+    Starts the AI cross-check in the background (once per preparation
+    text) and returns a Future resolving to the discrepancy flag.
+    A failed check (model down, circuit open, bad JSON) is kept as the
+    Future's exception and restarted by a call at least
+    AI_CHECK_RETRY_AFTER seconds after it failed, not on every rerun.
+    """
+
+    with _checks_lock:
+        future = _checks.get(preparation_text)
+        if future is not None:
+            failed_at = _failed_at.get(preparation_text)
+            if failed_at is None or time.monotonic() - failed_at < AI_CHECK_RETRY_AFTER:
+                return future
+
+        if future is None and len(_checks) >= AI_CHECK_CACHE_SIZE:
+            oldest = next(iter(_checks))
+            _checks.pop(oldest)
+            _failed_at.pop(oldest, None)
+
+        _failed_at.pop(preparation_text, None)
+        future = _get_executor().submit(_cross_check, preparation_text, rule_data)
+        future.add_done_callback(lambda f: _record_failure(preparation_text, f))
+        _checks[preparation_text] = future
+        return future
+
+
+def _record_failure(preparation_text, future):
+    if future.cancelled() or future.exception() is not None:
+        with _checks_lock:
+            if _checks.get(preparation_text) is future:
+                _failed_at[preparation_text] = time.monotonic()
+
+
+def ai_cross_check_result(preparation_text):
+    """
+    True/False once the check for this text is known (precomputed store or
+    finished background check), None while it is still running or when it
+    failed (see ai_cross_check_failed).
+    """
 
+    stored = stored_preparation_check(preparation_text)
+    if stored is not None:
+        return stored["ai_discrepancy"]
 
-def extract_reconstitution(preparation_text):
+    future = _checks.get(preparation_text)
+    if future is None or not future.done() or future.exception():
+        return None
+    return future.result()
+
+
+def ai_cross_check_pending(preparation_text):
+    """
+    True while a background check for this text is still running (and no
+    precomputed result exists), i.e. while the UI should keep polling.
+    """
+
+    if stored_preparation_check(preparation_text) is not None:
+        return False
+    future = _checks.get(preparation_text)
+    return future is not None and not future.done()
+
+
+def ai_cross_check_failed(preparation_text):
+    """
+    True when the last background check for this text failed, so the
+    result is unknown rather than "no discrepancy".
+    """
+
+    future = _checks.get(preparation_text)
+    return future is not None and future.done() and future.exception() is not None
+
+
+# =====================================================
+# PRECOMPUTED STORE (services/preparation_ingest.py)
+# =====================================================
+
+STORE_TTL = 300.0               # seconds before the stored checks are reloaded
+
+_store = {"checks": None, "loaded_at": 0.0}
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    with _store_lock:
+        if _store["checks"] is None or time.monotonic() - _store["loaded_at"] > STORE_TTL:
+            checks = {}
+            # the table lives in Postgres; offline backends have no store
+            if get_reference_backend().name == "postgres":
+                try:
+                    checks = load_preparation_checks()
+                except Exception:
+                    pass
+            _store["checks"] = checks
+            _store["loaded_at"] = time.monotonic()
+        return _store["checks"]
+
+
+def stored_preparation_check(preparation_text):
+    """
+    Precomputed result for this exact text, or None when the text is new
+    or was edited since the job last ran (the key is a hash of the text).
+    """
+    return _get_store().get(preparation_hash(preparation_text))
+
+
+def reload_preparation_store():
+    with _store_lock:
+        _store["checks"] = None
+
+
+# =====================================================
+# PREPARATION PIPELINE
+# =====================================================
+
+def extract_reconstitution(preparation_text, parsed=None, ai_check="sync"):
     """
     Deterministic-first preparation pipeline.
+    `parsed` is the pre-parsed preparation data from the ingest table
+    (ref["parsed"]["preparation"]); the text is parsed when it is missing.
+
+    ai_check:
+      "sync"        wait for the AI cross-check (original behaviour);
+                    ai_discrepancy is None when the model is unavailable
+      "background"  return the rule-based result immediately; ai_discrepancy
+                    is None until the check finishes (see ai_cross_check_result)
+      "store"       use the precomputed result for this text; texts not in the
+                    store (new or edited) fall back to "background"
+      "off"         skip the AI cross-check (ai_discrepancy is None)
     """
 
-    rule_data = rule_based_reconstitution(preparation_text)
-    ai_data = extract_reconstitution_ai(preparation_text)
+    if ai_check == "store":
+        stored = stored_preparation_check(preparation_text)
+        if stored is not None:
+            return dict(stored)
+        ai_check = "background"
 
-    discrepancy = False
+    rule_data = parsed if parsed is not None else rule_based_reconstitution(preparation_text)
 
-    if ai_data and ai_data.get("reconstitution"):
-        if ai_data["reconstitution"] != rule_data["reconstitution"]:
-            discrepancy = True
+    if ai_check == "sync":
+        discrepancy = _sync_cross_check(preparation_text, rule_data)
+    elif ai_check == "background":
+        future = start_ai_cross_check(preparation_text, rule_data)
+        discrepancy = future.result() if future.done() and not future.exception() else None
+    else:
+        discrepancy = None
 
     return {
         "reconstitution": rule_data["reconstitution"],
         "max_concentration_mg_ml": rule_data["max_concentration_mg_ml"],
         "dilution_only": rule_data["dilution_only"],
         "ai_discrepancy": discrepancy
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,461 @@
+"""
+Storage backends for drug reference lookups.
+
+    postgres  central database (default)
+    sqlite    embedded file built from database/schema.sql + a data import
+    snapshot  read-only Arrow snapshot (services/reference_snapshot.py)
+
+Selected with CLINICAL_REFERENCE_BACKEND. Every backend returns rows in
+the column order of REFERENCE_QUERY, so reference_service builds the
+same result dicts whatever the storage is.
+
+Build the SQLite file (from Postgres or from the Arrow snapshot):
+    python -m services.reference_backends --source postgres
+    python -m services.reference_backends --source snapshot
+"""
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import pathlib
+import argparse
+import threading
+
+# psycopg2 (postgres) and pyarrow (snapshot) are imported by the backends
+# that need them, so the sqlite backend runs with neither installed
+from .reference_columns import ROOT_DIR, SNAPSHOT_COLUMNS, ROW_HASH_COLUMN, row_hash_sql
+from .dosing_ingest import PARSER_VERSION, parse_reference_row
+
+
+BACKEND = os.environ.get(
+    "CLINICAL_REFERENCE_BACKEND",
+    # CLINICAL_REFERENCE_OFFLINE=1 predates the backend setting
+    "snapshot" if os.environ.get("CLINICAL_REFERENCE_OFFLINE", "0") == "1" else "postgres"
+)
+
+SQLITE_PATH = os.environ.get(
+    "CLINICAL_REFERENCE_SQLITE",
+    os.path.join(ROOT_DIR, "drug_reference.sqlite")
+)
+
+SCHEMA_PATH = os.path.join(ROOT_DIR, "database", "schema.sql")
+
+
+def normalize_key(value):
+    return " ".join(str(value).lower().split())
+
+
+def like_contains(value):
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+# ======================================================
+# Postgres
+# ======================================================
+
+# Uses the normalized columns and indexes from
+# database/migrations/001_reference_lookup_indexes.sql and the
+# pre-parsed rows from 002_drug_reference_parsed.sql
+REFERENCE_QUERY = f"""
+SELECT
+    d.dosage,
+    d.renal_adjustment,
+    d.renal_adjustment_dose,
+    d.administration,
+    d.preparation_for_administration,
+    p.dose_type,
+    p.dose_low,
+    p.dose_high,
+    p.max_daily_mg,
+    p.renal_bands,
+    p.reconstitution,
+    p.max_concentration_mg_ml,
+    p.dilution_only,
+    p.row_hash IS NOT NULL
+FROM drug_reference d
+LEFT JOIN drug_reference_parsed p
+    ON p.row_hash = {row_hash_sql("d")}
+    AND p.parser_version = %s
+WHERE d.generic_name_norm = %s
+AND d.indication_norm LIKE %s ESCAPE '\\';
+"""
+
+# Same lookup for many pairs at once: the pairs are joined in as a VALUES list
+BULK_REFERENCE_QUERY = f"""
+SELECT
+    q.idx,
+    d.dosage,
+    d.renal_adjustment,
+    d.renal_adjustment_dose,
+    d.administration,
+    d.preparation_for_administration,
+    p.dose_type,
+    p.dose_low,
+    p.dose_high,
+    p.max_daily_mg,
+    p.renal_bands,
+    p.reconstitution,
+    p.max_concentration_mg_ml,
+    p.dilution_only,
+    p.row_hash IS NOT NULL
+FROM (VALUES %s) AS q (idx, name, pattern)
+JOIN drug_reference d
+    ON d.generic_name_norm = q.name
+    AND d.indication_norm LIKE q.pattern ESCAPE '\\'
+LEFT JOIN drug_reference_parsed p
+    ON p.row_hash = {row_hash_sql("d")}
+    AND p.parser_version = {int(PARSER_VERSION)}
+ORDER BY q.idx;
+"""
+
+
+VOCABULARY_QUERY = """
+SELECT DISTINCT generic_name, brand_name, indication
+FROM drug_reference
+WHERE generic_name IS NOT NULL;
+"""
+
+
+class PostgresReferenceBackend:
+
+    name = "postgres"
+
+    def fetch_rows(self, drug_name, indication):
+        from .db_connection import connection
+
+        # arguments are already normalized (see normalize_key)
+        # pooled connection: returned to the pool instead of closed
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    REFERENCE_QUERY,
+                    (PARSER_VERSION, drug_name, like_contains(indication))
+                )
+                return cursor.fetchall()
+
+    def fetch_rows_bulk(self, keys):
+        from psycopg2.extras import execute_values
+        from .db_connection import connection
+
+        values = [
+            (i, drug_name, like_contains(indication))
+            for i, (drug_name, indication) in enumerate(keys)
+        ]
+
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                rows = execute_values(
+                    cursor,
+                    BULK_REFERENCE_QUERY,
+                    values,
+                    template="(%s::int, %s::text, %s::text)",
+                    page_size=len(values),
+                    fetch=True
+                )
+
+        grouped = [[] for _ in keys]
+        for row in rows:
+            grouped[row[0]].append(row[1:])
+        return grouped
+
+    def vocabulary(self):
+        from .db_connection import connection
+
+        # distinct (generic_name, brand_name, indication) for query matching
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(VOCABULARY_QUERY)
+                return cursor.fetchall()
+
+    def table_version(self):
+        from .db_connection import connection
+
+        # order-independent hash of every row: changes on any insert/update/delete
+        query = """
+        SELECT COUNT(*), COALESCE(md5(string_agg(md5(d::text), '' ORDER BY md5(d::text))), '')
+        FROM drug_reference d;
+        """
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query)
+                return cursor.fetchone()
+
+
+# ======================================================
+# Arrow snapshot (read-only, offline)
+# ======================================================
+class SnapshotReferenceBackend:
+
+    name = "snapshot"
+
+    columns = [
+        "dosage",
+        "renal_adjustment",
+        "renal_adjustment_dose",
+        "administration",
+        "preparation_for_administration",
+    ]
+
+    def fetch_rows(self, drug_name, indication):
+        from .reference_snapshot import get_snapshot_index
+
+        index = get_snapshot_index()
+        return index.fetch(index.find_rows(drug_name, indication), self.columns)
+
+    def fetch_rows_bulk(self, keys):
+        return [self.fetch_rows(*key) for key in keys]
+
+    def vocabulary(self):
+        from .reference_snapshot import get_snapshot_index
+
+        table = get_snapshot_index().table
+        rows = zip(*(table.column(c).to_pylist() for c in ("generic_name", "brand_name", "indication")))
+        return list(dict.fromkeys(row for row in rows if row[0] is not None))
+
+    def table_version(self):
+        from .reference_snapshot import snapshot_version
+
+        return snapshot_version()
+
+
+# ======================================================
+# Embedded SQLite
+# ======================================================
+SQLITE_PARSED_COLUMNS = [
+    ("dose_type", "TEXT"),
+    ("dose_low", "REAL"),
+    ("dose_high", "REAL"),
+    ("max_daily_mg", "REAL"),
+    ("renal_bands", "TEXT"),                # JSON
+    ("reconstitution", "TEXT"),             # JSON
+    ("max_concentration_mg_ml", "REAL"),
+    ("dilution_only", "INTEGER"),
+]
+
+SQLITE_QUERY = f"""
+SELECT
+    dosage,
+    renal_adjustment,
+    renal_adjustment_dose,
+    administration,
+    preparation_for_administration,
+    {", ".join(name for name, _ in SQLITE_PARSED_COLUMNS)},
+    1
+FROM drug_reference
+WHERE generic_name_norm = ?
+AND indication_norm LIKE ? ESCAPE '\\'
+ORDER BY rowid;
+"""
+
+
+def _schema_columns(schema_path=SCHEMA_PATH):
+    """
+    Plain source columns of drug_reference as declared in schema.sql
+    (generated Postgres-only columns are skipped).
+    """
+    with open(schema_path, encoding="utf-8") as f:
+        schema = f.read()
+
+    body = re.search(r"CREATE TABLE drug_reference\s*\((.*?)\n\);", schema, re.S).group(1)
+    body = re.sub(r"--[^\n]*", "", body)
+
+    columns = []
+    for definition in re.split(r",\s*\n", body):
+        definition = " ".join(definition.split())
+        if not definition or "GENERATED" in definition.upper():
+            continue
+        name, col_type = definition.split(" ", 1)
+        columns.append((name, col_type))
+    return columns
+
+
+def build_sqlite(rows, path=SQLITE_PATH, version=None, schema_path=SCHEMA_PATH):
+    """
+    Builds the SQLite reference file from an iterable of drug_reference
+    rows (dicts keyed by column name). Rows are parsed once here, the
+    same way services.dosing_ingest fills drug_reference_parsed.
+    """
+    source_columns = _schema_columns(schema_path)
+    names = [name for name, _ in source_columns]
+
+    column_sql = ",\n    ".join(
+        [f"{name} {col_type}" for name, col_type in source_columns]
+        + ["generic_name_norm TEXT", "indication_norm TEXT", f"{ROW_HASH_COLUMN} TEXT"]
+        + [f"{name} {col_type}" for name, col_type in SQLITE_PARSED_COLUMNS]
+    )
+
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    db = sqlite3.connect(tmp_path)
+    try:
+        db.executescript(f"""
+        CREATE TABLE drug_reference (
+            {column_sql}
+        );
+        CREATE TABLE reference_meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+        records = []
+        hashes = []
+        for row in rows:
+            parsed = parse_reference_row(
+                row.get("dosage"),
+                row.get("renal_adjustment_dose"),
+                row.get("preparation_for_administration")
+            )
+            row_hash = row.get(ROW_HASH_COLUMN) or hashlib.md5(
+                json.dumps([row.get(name) for name in names]).encode()
+            ).hexdigest()
+            hashes.append(row_hash)
+
+            records.append(
+                [row.get(name) for name in names]
+                + [
+                    normalize_key(row["generic_name"]) if row.get("generic_name") is not None else None,
+                    normalize_key(row["indication"]) if row.get("indication") is not None else None,
+                    row_hash,
+                    parsed["dose_type"],
+                    parsed["dose_low"],
+                    parsed["dose_high"],
+                    parsed["max_daily_mg"],
+                    json.dumps(parsed["renal_bands"]),
+                    json.dumps(parsed["reconstitution"]),
+                    parsed["max_concentration_mg_ml"],
+                    int(parsed["dilution_only"]),
+                ]
+            )
+
+        placeholders = ", ".join("?" for _ in records[0]) if records else ""
+        if records:
+            db.executemany(f"INSERT INTO drug_reference VALUES ({placeholders})", records)
+
+        db.executescript("""
+        CREATE INDEX idx_drug_reference_generic_name_norm
+            ON drug_reference (generic_name_norm, indication_norm);
+        ANALYZE;
+        """)
+
+        if version is None:
+            version = hashlib.md5("".join(sorted(hashes)).encode()).hexdigest()
+        db.executemany(
+            "INSERT INTO reference_meta VALUES (?, ?)",
+            [("table_version", version), ("parser_version", str(PARSER_VERSION))]
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class SqliteReferenceBackend:
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _db(self):
+        # sqlite3 connections are per thread; opened read-only
+        db = getattr(self._local, "db", None)
+        if db is None:
+            uri = pathlib.Path(self.path).resolve().as_uri() + "?mode=ro"
+            db = sqlite3.connect(uri, uri=True)
+            self._local.db = db
+        return db
+
+    def _parsed_current(self):
+        # parses from an older parser version are ignored, like in Postgres
+        row = self._db().execute(
+            "SELECT value FROM reference_meta WHERE key = 'parser_version'"
+        ).fetchone()
+        return row is not None and row[0] == str(PARSER_VERSION)
+
+    def fetch_rows(self, drug_name, indication):
+        rows = self._db().execute(
+            SQLITE_QUERY, (drug_name, like_contains(indication))
+        ).fetchall()
+
+        parsed_current = self._parsed_current()
+
+        # same shape as the Postgres rows (JSON decoded, booleans restored)
+        return [
+            row[:9]
+            + (json.loads(row[9]), json.loads(row[10]), row[11], bool(row[12]), parsed_current)
+            for row in rows
+        ]
+
+    def fetch_rows_bulk(self, keys):
+        return [self.fetch_rows(*key) for key in keys]
+
+    def vocabulary(self):
+        return self._db().execute(VOCABULARY_QUERY).fetchall()
+
+    def table_version(self):
+        row = self._db().execute(
+            "SELECT value FROM reference_meta WHERE key = 'table_version'"
+        ).fetchone()
+        return row[0] if row else None
+
+
+BACKENDS = {
+    "postgres": PostgresReferenceBackend,
+    "sqlite": SqliteReferenceBackend,
+    "snapshot": SnapshotReferenceBackend,
+}
+
+
+def get_backend(name=BACKEND):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown reference backend '{name}' (expected one of: {', '.join(BACKENDS)})"
+        )
+
+
+# ======================================================
+# SQLite build command
+# ======================================================
+def _rows_from_postgres():
+    from .db_connection import connection
+
+    query = f"SELECT {', '.join(SNAPSHOT_COLUMNS)}, {row_hash_sql()} FROM drug_reference"
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query)
+            columns = SNAPSHOT_COLUMNS + [ROW_HASH_COLUMN]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _rows_from_snapshot():
+    from .reference_snapshot import load_snapshot
+
+    return load_snapshot().to_pylist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the embedded SQLite reference database.")
+    parser.add_argument("--source", choices=["postgres", "snapshot"], default="postgres")
+    parser.add_argument("--path", default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    if args.source == "postgres":
+        count = build_sqlite(_rows_from_postgres(), args.path)
+    else:
+        from .reference_snapshot import snapshot_version
+
+        count = build_sqlite(_rows_from_snapshot(), args.path, version=snapshot_version())
+
+    print(f"[OK] {args.path}: {count} rows from {args.source}")
+
+
+if __name__ == "__main__":
+    main()
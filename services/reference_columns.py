@@ -0,0 +1,35 @@
+"""
+Column layout of the drug_reference table shared by the reference
+backends, the Arrow snapshot and the ingest jobs.
+
+No third-party imports, so the offline backends (sqlite, snapshot) can
+use it without psycopg2 installed.
+"""
+
+import os
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SNAPSHOT_COLUMNS = [
+    "generic_name",
+    "brand_name",
+    "drug_class",
+    "indication",
+    "dosage",
+    "renal_adjustment",
+    "renal_adjustment_dose",
+    "administration",
+    "preparation_for_administration",
+    "storage_stability",
+]
+
+ROW_HASH_COLUMN = "row_hash"
+
+
+def row_hash_sql(alias=None):
+    """
+    SQL expression for the md5 of a row's source columns.
+    """
+    prefix = f"{alias}." if alias else ""
+    return f"md5(ROW({', '.join(prefix + c for c in SNAPSHOT_COLUMNS)})::text)"
@@ -1,32 +1,257 @@
-from .db_connection import get_connection
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+from .reference_backends import get_backend, normalize_key
+from .dosing_ingest import parsed_from_row
+from .logic_service import RenalBandIndex
+
+
+CACHE_MAX_ENTRIES = 512
+CACHE_TTL_SECONDS = 600
+VERSION_CHECK_INTERVAL = 30     # seconds between table-version checks
+
+_MISSING = object()             # cached "No reference found"
+_VOCABULARY_KEY = ("__vocabulary__",)
+
+
+# ======================================================
+# Reference cache
+# ======================================================
+class ReferenceCache:
+    """
+    Read-through LRU cache for drug_reference lookups.
+
+    Entries expire after `ttl` seconds and the whole cache is dropped
+    when the table version (a hash over all rows) changes.
+    Negative results are cached too.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS,
+                 version_check_interval=VERSION_CHECK_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+
+        self._entries = OrderedDict()   # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self.stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            stored_at, value = entry
+            if now - stored_at > self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            if value is _MISSING:
+                self.stats["negative_hits"] += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def check_version(self, fetch_version):
+        """
+        Re-reads the table version at most every `version_check_interval`
+        seconds and clears the cache when it changed.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+
+        version = fetch_version()
+
+        with self._lock:
+            self._version_checked_at = now
+            changed = self._version is not None and version != self._version
+            self._version = version
+
+        if changed:
+            self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = ReferenceCache()
+
+
+_normalize = normalize_key
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_reference_backend():
+    """
+    Storage backend selected by CLINICAL_REFERENCE_BACKEND
+    (postgres / sqlite / snapshot), created on first use.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = get_backend()
+    return _backend
+
+
+def set_reference_backend(backend):
+    """
+    Switches the backend at runtime (e.g. a SqliteReferenceBackend for tests
+    or benchmarks) and drops everything cached from the previous one.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    _cache.clear()
+
+
+def _fetch_table_version():
+    return get_reference_backend().table_version()
+
+
+def invalidate_reference_cache():
+    _cache.clear()
+
+
+def reference_cache_stats():
+    stats = dict(_cache.stats)
+    stats["size"] = len(_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
 
 ## Get drug reference information from the database :
-def get_drug_reference(drug_name, indication): 
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    query = """
-    SELECT
-        dosage,
-        renal_adjustment,
-        renal_adjustment_dose,
-        administration,
-        preparation_for_administration
-    FROM drug_reference
-    WHERE LOWER(generic_name) = LOWER(%s)
-    AND LOWER(indication) LIKE LOWER(%s);
-    """
-
-    cursor.execute(
-        query,
-        (drug_name, f"%{indication}%")
+def get_drug_reference(drug_name, indication, use_cache=True):
+    key = (_normalize(drug_name), _normalize(indication))
+
+    if not use_cache:
+        return _query_drug_reference(*key)
+
+    _cache.check_version(_fetch_table_version)
+
+    cached = _cache.get(key)
+    if cached is not None:
+        return None if cached is _MISSING else dict(cached)
+
+    ref = _query_drug_reference(*key)
+    _cache.put(key, _MISSING if ref is None else ref)
+
+    return None if ref is None else dict(ref)
+
+
+def get_drug_references(pairs, use_cache=True):
+    """
+    Bulk lookup for many (drug_name, indication) pairs.
+    Cache misses are resolved in a single database round trip.
+    Returns a list aligned with `pairs` (same dicts / None as get_drug_reference).
+    """
+    keys = [(_normalize(drug), _normalize(indication)) for drug, indication in pairs]
+
+    found = {}
+    if use_cache:
+        _cache.check_version(_fetch_table_version)
+        for key in set(keys):
+            cached = _cache.get(key)
+            if cached is not None:
+                found[key] = cached
+
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+
+    if missing:
+        results = _query_drug_references(missing)
+        for key, ref in zip(missing, results):
+            found[key] = _MISSING if ref is None else ref
+            if use_cache:
+                _cache.put(key, found[key])
+
+    return [
+        None if found[key] is _MISSING else dict(found[key])
+        for key in keys
+    ]
+
+
+def get_reference_vocabulary():
+    """
+    Distinct (generic_name, brand_name, indication) rows, cached like the
+    lookups and refreshed when the table version changes.
+    """
+    _cache.check_version(_fetch_table_version)
+
+    vocabulary = _cache.get(_VOCABULARY_KEY)
+    if vocabulary is None:
+        vocabulary = tuple(tuple(row) for row in get_reference_backend().vocabulary())
+        _cache.put(_VOCABULARY_KEY, vocabulary)
+
+    return vocabulary
+
+
+# ======================================================
+# Async API (for asyncio servers)
+# ======================================================
+# The backends are blocking (psycopg2 / sqlite3), so lookups run on the
+# default executor and share the pool and cache with synchronous callers.
+async def get_drug_reference_async(drug_name, indication, use_cache=True):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, get_drug_reference, drug_name, indication, use_cache
+    )
+
+
+async def get_drug_references_async(pairs, use_cache=True):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, get_drug_references, list(pairs), use_cache
     )
 
-    rows = cursor.fetchall()   
 
-    cursor.close()
-    conn.close()
+def _query_drug_reference(drug_name, indication):
+    # arguments are already normalized (see _normalize)
+    return _build_reference(get_reference_backend().fetch_rows(drug_name, indication))
+
+
+def _query_drug_references(keys):
+    # keys are already normalized (drug_name, indication) pairs
+    return [
+        _build_reference(rows)
+        for rows in get_reference_backend().fetch_rows_bulk(keys)
+    ]
+
 
+def _build_reference(rows):
     if not rows:
         return None
 
@@ -42,4 +267,28 @@ def get_drug_reference(drug_name, indication):
         "renal_adjustment_dose": "\n".join(renal_doses),  # ✅ كلهم
         "administration": rows[0][3],
         "preparation": rows[0][4],
-    }
\ No newline at end of file
+        "parsed": _build_parsed(rows),
+    }
+
+
+def _build_parsed(rows):
+    """
+    Pre-parsed data for the matched rows, or None when any row has not
+    been ingested yet (callers then parse the text themselves).
+    """
+    if any(len(row) < 14 or not row[13] for row in rows):
+        return None
+
+    parsed = parsed_from_row(*rows[0][5:13])
+
+    # renal bands of every matched row, in the same order as renal_adjustment_dose
+    parsed["renal_bands"] = [
+        band
+        for row in rows
+        for band in parsed_from_row(*row[5:13])["renal_bands"]
+    ]
+
+    # built once per cached reference, shared by the CLI and the UI
+    parsed["renal_index"] = RenalBandIndex(parsed["renal_bands"])
+
+    return parsed
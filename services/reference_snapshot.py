@@ -0,0 +1,239 @@
+"""
+Columnar snapshot of the drug_reference table.
+
+The snapshot is an uncompressed Arrow IPC file, so readers memory-map it
+and get the columns without copying or parsing.  It replaces the old
+drugs.csv dump that db_connection used to write at import time.
+
+Build / refresh it explicitly:
+    python -m services.reference_snapshot
+"""
+
+import os
+import time
+import argparse
+import hashlib
+import threading
+from collections import Counter
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .db_connection import connection
+from .reference_columns import ROOT_DIR, SNAPSHOT_COLUMNS, ROW_HASH_COLUMN, row_hash_sql
+
+
+SNAPSHOT_PATH = os.environ.get(
+    "CLINICAL_REFERENCE_SNAPSHOT",
+    os.path.join(ROOT_DIR, "drug_reference.arrow")
+)
+
+
+_ROW_HASH_SQL = row_hash_sql()
+
+SNAPSHOT_SCHEMA = pa.schema(
+    [pa.field(name, pa.string()) for name in SNAPSHOT_COLUMNS]
+    + [pa.field(ROW_HASH_COLUMN, pa.string())]
+)
+
+
+# ======================================================
+# Reading
+# ======================================================
+def load_snapshot(path=SNAPSHOT_PATH):
+    """
+    Memory-maps the snapshot and returns it as a pyarrow Table (zero-copy).
+    """
+    source = pa.memory_map(path, "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def snapshot_version(path=SNAPSHOT_PATH):
+    """
+    Table version recorded when the snapshot was written (None if missing).
+    """
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, "r") as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return metadata.get(b"table_version", b"").decode() or None
+
+
+def _table_version(row_hashes):
+    digest = hashlib.md5()
+    for row_hash in sorted(row_hashes):
+        digest.update(row_hash.encode())
+    return digest.hexdigest()
+
+
+# ======================================================
+# Offline lookups
+# ======================================================
+class SnapshotIndex:
+    """
+    In-memory lookup over a loaded snapshot, keyed on the normalized
+    generic name. Mirrors the SQL lookup in reference_service.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._rows_by_name = {}
+
+        names = table.column("generic_name").to_pylist()
+        indications = table.column("indication").to_pylist()
+
+        for i, (name, indication) in enumerate(zip(names, indications)):
+            if name is None:
+                continue
+            key = " ".join(name.lower().split())
+            if indication is not None:
+                indication = " ".join(indication.lower().split())
+            self._rows_by_name.setdefault(key, []).append((i, indication))
+
+    def find_rows(self, drug_name, indication):
+        """
+        Row indices whose name equals and whose indication contains the
+        (already normalized) arguments.
+        """
+        return [
+            i for i, row_indication in self._rows_by_name.get(drug_name, [])
+            if row_indication is not None and indication in row_indication
+        ]
+
+    def fetch(self, rows, columns):
+        if not rows:
+            return []
+        subset = self.table.take(pa.array(rows, type=pa.int64())).select(columns)
+        return list(zip(*(subset.column(c).to_pylist() for c in columns)))
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def get_snapshot_index(path=SNAPSHOT_PATH):
+    """
+    Shared SnapshotIndex, reloaded when the snapshot file is replaced.
+    """
+    global _index, _index_mtime
+    mtime = os.path.getmtime(path)
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = SnapshotIndex(load_snapshot(path))
+            _index_mtime = mtime
+        return _index
+
+
+# ======================================================
+# Building
+# ======================================================
+def _fetch_row_hashes(cursor):
+    cursor.execute(f"SELECT {_ROW_HASH_SQL} FROM drug_reference")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _fetch_rows(cursor, row_hashes=None):
+    query = f"SELECT {', '.join(SNAPSHOT_COLUMNS)}, {_ROW_HASH_SQL} AS {ROW_HASH_COLUMN} FROM drug_reference"
+    if row_hashes is None:
+        cursor.execute(query)
+    else:
+        cursor.execute(f"{query} WHERE {_ROW_HASH_SQL} = ANY(%s)", (list(row_hashes),))
+    return cursor.fetchall()
+
+
+def _rows_to_table(rows):
+    columns = list(zip(*rows)) if rows else [[] for _ in SNAPSHOT_SCHEMA]
+    return pa.Table.from_arrays(
+        [pa.array(col, type=pa.string()) for col in columns],
+        schema=SNAPSHOT_SCHEMA
+    )
+
+
+def _write_snapshot(table, path, version):
+    table = table.replace_schema_metadata({
+        "table_version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def build_snapshot(path=SNAPSHOT_PATH, full=False):
+    """
+    Writes / refreshes the snapshot.
+
+    Only rows whose hash is not already in the existing snapshot are read
+    from the database; unchanged rows are carried over from the old file.
+    Returns a summary dict.
+    """
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            new_hashes = _fetch_row_hashes(cursor)
+            version = _table_version(new_hashes)
+
+            old_table = None
+            if not full and os.path.exists(path):
+                # read into memory (not mapped) so the file can be replaced below
+                with pa.OSFile(path, "rb") as source:
+                    old_table = pa.ipc.open_file(source).read_all()
+                if old_table.schema.remove_metadata() != SNAPSHOT_SCHEMA:
+                    old_table = None
+
+            old_version = (old_table.schema.metadata or {}).get(b"table_version", b"").decode() \
+                if old_table is not None else None
+
+            if old_version == version:
+                return {"status": "unchanged", "rows": old_table.num_rows,
+                        "added": 0, "removed": 0, "version": version}
+
+            new_counts = Counter(new_hashes)
+            old_hashes = old_table.column(ROW_HASH_COLUMN).to_pylist() if old_table is not None else []
+            old_counts = Counter(old_hashes)
+
+            # identical duplicate rows make a hash-based merge ambiguous
+            if old_table is None or any(n > 1 for n in new_counts.values()) \
+                    or any(n > 1 for n in old_counts.values()):
+                table = _rows_to_table(_fetch_rows(cursor))
+                added, removed = table.num_rows, len(old_hashes)
+            else:
+                added_hashes = new_counts.keys() - old_counts.keys()
+                removed_hashes = old_counts.keys() - new_counts.keys()
+
+                kept = old_table.filter(
+                    pc.is_in(old_table.column(ROW_HASH_COLUMN),
+                             value_set=pa.array(list(new_counts.keys()), type=pa.string()))
+                )
+                fresh = _rows_to_table(_fetch_rows(cursor, added_hashes)) if added_hashes \
+                    else _rows_to_table([])
+                table = pa.concat_tables([kept.replace_schema_metadata(None), fresh])
+                added, removed = len(added_hashes), len(removed_hashes)
+
+    _write_snapshot(table, path, version)
+
+    return {"status": "written", "rows": table.num_rows,
+            "added": added, "removed": removed, "version": version}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the drug_reference snapshot.")
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild from scratch instead of merging changed rows")
+    args = parser.parse_args()
+
+    summary = build_snapshot(args.path, full=args.full)
+
+    print(
+        f"[OK] {args.path}: {summary['status']} | "
+        f"{summary['rows']} rows | +{summary['added']} / -{summary['removed']} | "
+        f"version {summary['version']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
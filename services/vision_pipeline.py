@@ -0,0 +1,122 @@
+"""
+Vision pipeline for vial photos.
+
+The upload is decoded once; the ResNet classifier runs on a worker thread
+while the OCR runs on the Tesseract pool (services/ocr_engine.py), both on
+the same decoded image. Torch and Tesseract release the GIL, so the
+end-to-end latency is close to max(CNN, OCR) instead of their sum.
+
+Results are cached on disk by the hash of the image bytes
+(ai_vision_service.get_vision_cache).
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .ai_vision_service import (
+    load_image,
+    extract_text_from_image,
+    extract_vial_strength_mg,
+    get_vision_cache,
+    image_hash,
+    VISION_CACHE_VERSION,
+)
+from .ocr_engine import OCRError
+from .disk_cache import make_key
+
+
+CNN_WORKERS = 1                 # one model instance; calls are serialized
+
+_cnn_executor = None
+_cnn_lock = threading.Lock()
+
+
+def _get_cnn_executor():
+    global _cnn_executor
+    if _cnn_executor is None:
+        with _cnn_lock:
+            if _cnn_executor is None:
+                _cnn_executor = ThreadPoolExecutor(max_workers=CNN_WORKERS, thread_name_prefix="cnn")
+    return _cnn_executor
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_vision_pipeline(image, classify, concurrent=True):
+    """
+    Classifier + OCR + strength parsing for one vial photo.
+    `image` is anything load_image accepts; `classify` maps a PIL image to
+    (label, confidence). concurrent=False runs the stages one after the
+    other (for comparison).
+    Returns drug, confidence, ocr_text, vial_strength_mg, ocr_error and
+    timings (decode_ms, cnn_ms, ocr_ms, parse_ms, total_ms).
+    """
+    start = time.perf_counter()
+
+    image, decode_ms = _timed(load_image, image)
+
+    if concurrent:
+        cnn_future = _get_cnn_executor().submit(_timed, classify, image)
+    else:
+        cnn_result = _timed(classify, image)
+
+    ocr_error = None
+    ocr_start = time.perf_counter()
+    try:
+        ocr_text = extract_text_from_image(image)
+    except OCRError as e:
+        ocr_error = str(e)
+        ocr_text = ""
+    ocr_ms = (time.perf_counter() - ocr_start) * 1000
+
+    (drug, confidence), cnn_ms = cnn_future.result() if concurrent else cnn_result
+
+    vial_strength, parse_ms = _timed(extract_vial_strength_mg, ocr_text)
+
+    return {
+        "drug": drug,
+        "confidence": float(confidence),
+        "ocr_text": ocr_text,
+        "vial_strength_mg": vial_strength,
+        "ocr_error": ocr_error,
+        "timings": {
+            "decode_ms": decode_ms,
+            "cnn_ms": cnn_ms,
+            "ocr_ms": ocr_ms,
+            "parse_ms": parse_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        },
+    }
+
+
+def analyze_vial_image(data: bytes, classify, model_tag=None, use_cache=True):
+    """
+    run_vision_pipeline with the on-disk cache in front of it.
+    `model_tag` identifies the classifier weights so retrained models miss
+    the cache. Repeat uploads and reruns only cost the hash of the bytes.
+    Results with an OCR error or no OCR text are returned but not cached.
+    """
+    start = time.perf_counter()
+
+    key = make_key(VISION_CACHE_VERSION, model_tag, image_hash(data))
+    cache = get_vision_cache()
+
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            total_ms = (time.perf_counter() - start) * 1000
+            return dict(cached, cached=True, timings={"total_ms": total_ms})
+
+    result = run_vision_pipeline(data, classify)
+    timings = result.pop("timings")
+
+    if use_cache and result["ocr_error"] is None and result["ocr_text"].strip():
+        cache.set(key, result)
+
+    timings["total_ms"] = (time.perf_counter() - start) * 1000
+    return dict(result, cached=False, timings=timings)